@@ -1,101 +1,132 @@
-from collections import defaultdict
+from collections import namedtuple
+from types import MappingProxyType
 import alpaca_trade_api as tradeapi
-from alpaca_trade_api.rest import TimeFrame, REST
-from datetime import date, timedelta
+from alpaca_trade_api.rest import TimeFrame, TimeFrameUnit, REST
+from datetime import date, timedelta, datetime, timezone
 import logging
+import time
+import numpy as np
 import pandas as pd
+from BarCache import BarCache
+from FillLedger import FillLedger
+from Metrics import metrics, InstrumentedREST
+from RequestScheduler import RequestScheduler, ScheduledREST
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("AlpacaAPI")#="TradingBot"
 logger.setLevel(logging.INFO)
 
 
+# Read-only view of the account's positions at one instant. positions maps
+# symbol -> read-only {'qty', 'current_price', 'market_price'}.
+PositionSnapshot = namedtuple('PositionSnapshot', ['timestamp', 'positions'])
+
+
 class AlpacaAPI:
-    def __init__(self, api_key, secret_key, base_url="https://paper-api.alpaca.markets"):
+    def __init__(self, api_key, secret_key, base_url="https://paper-api.alpaca.markets", cache_path="bar_cache.db",
+                 requests_per_minute=200, ledger_path="fill_ledger.db"):
         """
         Alpaca API wrapper for trading and data fetching using alpaca-trade-api.
+        Historical bars are kept in a local BarCache at cache_path (None disables it), and
+        filled orders in a FillLedger at ledger_path that checkbook and sold_book are read from.
+        All REST calls go through one RequestScheduler sized to requests_per_minute, and
+        every call is timed and counted in Metrics.metrics.
         """
-        self.api = tradeapi.REST(api_key, secret_key, base_url)
+        self.scheduler = RequestScheduler(requests_per_minute)
+        rest = ScheduledREST(tradeapi.REST(api_key, secret_key, base_url), self.scheduler)
+        self.api = InstrumentedREST(rest, metrics)
+        self.bar_cache = BarCache(cache_path) if cache_path else None
         self.positions = {}  # Track current stocks
-        self.checkbook = {}  # Track buy prices
-        self.sold_book = {}  # History sold symbols
+        self.ledger = FillLedger(ledger_path or ":memory:")
+        self.checkbook = self.ledger.checkbook  # Track buy prices
+        self.sold_book = self.ledger.sold_book  # History sold symbols
+        self.snapshot = None  # Latest PositionSnapshot
+        self.snapshot_ttl = 5  # Seconds a snapshot is reused by fetch_positions
+        self.__fill_signature__ = None  # (symbol, qty, avg entry) set seen at the last checkbook refresh
+        self.clock = None  # Last market clock; valid until its next open/close
+        self.account = None  # (fetched_at, account) cached for account_ttl seconds
+        self.account_ttl = 10
+
+    def sync_fills(self):
+        """
+        Bring the fill ledger up to date; only orders newer than the last sync are fetched.
+        """
+        try:
+            return self.ledger.sync(self.api)
+        except Exception as e:
+            logging.error(f"Error syncing fills: {e}")
+            return []
 
-    from collections import defaultdict
 
     def populate_checkbook(self):
         """
         Fetch past buy orders and populate the checkbook with all buy prices for each symbol.
         """
-        try:
-            # Initialize checkbook as a defaultdict of lists
-            if not isinstance(self.checkbook, defaultdict):
-                self.checkbook = defaultdict(list)
-
-            # Fetch all closed orders
-            orders = self.api.list_orders(status='filled', limit=500)
-
-            for order in orders:
-                # Only process buy orders
-                if order.side == 'buy' and order.filled_avg_price:
-                    symbol = order.symbol
-                    buy_price = float(order.filled_avg_price)
-
-                    # Append buy price to the list for the symbol
-                    if buy_price not in self.checkbook[symbol]:
-                       self.checkbook[symbol].append(buy_price)
-                       logging.info(f"Added {symbol} to checkbook with buy price {buy_price}")
-
-        except Exception as e:
-            logging.error(f"Error populating checkbook: {e}")
+        self.sync_fills()
 
 
     def populate_sold_book(self):
         """
         Populate sold_book with past sell transactions.
         """
-        transactions = self.fetch_all_transactions()
-        for txn in transactions:
-            if txn['side'] == 'sell' and txn['price'] is not None:
-                self.sold_book[txn['symbol']] = {
-                    'sell_price': txn['price'],
-                    'timestamp': txn['timestamp']
-                }
-                logging.info(f"Added {txn['symbol']} to sold_book with price {txn['price']}")
+        self.sync_fills()
 
 
-    def fetch_positions(self):
+    def snapshot_positions(self):
         """
-        Fetch current positions from Alpaca API, including real-time market prices.
+        Take a fresh, immutable snapshot of current positions.
+        Latest trades for every held symbol come from a single multi-symbol request, and the
+        checkbook is only re-read when the positions show that a fill happened.
         """
         try:
-            # Fetch current positions
             positions = self.api.list_positions()
-
-            # Store positions with additional real-time price info
-            self.positions = {}
-            for pos in positions:
-                symbol = pos.symbol
-                qty = int(pos.qty)
-                current_price = float(pos.current_price)
-
-                # Fetch the latest market price (real-time data)
-                try:
-                    latest_trade = self.api.get_latest_trade(symbol=symbol, feed='iex')
-                    market_price = float(latest_trade.price)  # Real-time price
-                except Exception as e:
-                    market_price = current_price  # Fallback to Alpaca's current_price
-                    logger.warning(f"Error fetching real-time price for {symbol}: {e}")
-
-                self.positions[symbol] = {
-                    'qty': int(qty),
-                    'current_price': float(current_price),  # From Alpaca position data
-                    'market_price': float(market_price)    # Real-time market price
-                }
-            self.populate_checkbook()
-            return self.positions
         except tradeapi.rest.APIError as e:
             raise Exception(f"Error fetching positions: {e}")
 
+        symbols = [pos.symbol for pos in positions]
+        latest_trades = {}
+        if symbols:
+            try:
+                latest_trades = self.api.get_latest_trades(symbols, feed='iex')
+            except Exception as e:
+                logger.warning(f"Error fetching real-time prices for {len(symbols)} symbols: {e}")
+
+        snapshot_positions = {}
+        for pos in positions:
+            current_price = float(pos.current_price)
+            latest_trade = latest_trades.get(pos.symbol)
+            # Fallback to Alpaca's current_price when no real-time trade came back
+            market_price = float(latest_trade.price) if latest_trade is not None else current_price
+            snapshot_positions[pos.symbol] = MappingProxyType({
+                'qty': int(pos.qty),
+                'current_price': current_price,  # From Alpaca position data
+                'market_price': market_price    # Real-time market price
+            })
+
+        fill_signature = frozenset((pos.symbol, int(pos.qty), str(pos.avg_entry_price)) for pos in positions)
+        if fill_signature != self.__fill_signature__:
+            self.account = None  # cash and portfolio value moved with the fill
+            self.populate_checkbook()
+            self.__fill_signature__ = fill_signature
+
+        self.snapshot = PositionSnapshot(datetime.now(timezone.utc), MappingProxyType(snapshot_positions))
+        return self.snapshot
+
+
+    def fetch_positions(self, max_age=None):
+        """
+        Fetch current positions from Alpaca API, including real-time market prices.
+        A snapshot younger than max_age seconds (default snapshot_ttl) is reused instead of
+        going back to the API.
+        """
+        max_age = self.snapshot_ttl if max_age is None else max_age
+        snapshot = self.snapshot
+        if snapshot is None or (datetime.now(timezone.utc) - snapshot.timestamp).total_seconds() > max_age:
+            snapshot = self.snapshot_positions()
+
+        self.positions = {symbol: dict(data) for symbol, data in snapshot.positions.items()}
+        return self.positions
+
 
     def place_order(self, symbol, qty, side="buy", order_type="market", time_in_force="gtc"):
         """
@@ -109,34 +140,191 @@ class AlpacaAPI:
                 type=order_type,
                 time_in_force=time_in_force,
             )
+            self.snapshot = None  # positions are about to change
+            self.account = None
             print(f"Order placed: {order}")
+            return order
         except tradeapi.rest.APIError as e:
             raise Exception(f"Error placing order: {e}")
 
+    def fetch_recent_orders(self, after=None):
+        """
+        Every order submitted after `after` (all statuses), oldest first, paging past the 500 limit.
+        Each page after the first starts 1us before the previous page's last submitted_at, since
+        `after` is exclusive and a batch of orders often shares one timestamp; the overlap is
+        dropped by order id.
+        """
+        orders = []
+        seen = set()
+        after = pd.Timestamp(after).isoformat() if after is not None else None
+        try:
+            while True:
+                page = self.api.list_orders(status='all', limit=500, after=after, direction='asc')
+                new = [order for order in page if order.id not in seen]
+                seen.update(order.id for order in new)
+                orders.extend(new)
+                if len(page) < 500 or not new:
+                    return orders
+                after = (pd.Timestamp(page[-1].submitted_at) - pd.Timedelta(microseconds=1)).isoformat()
+        except tradeapi.rest.APIError as e:
+            raise Exception(f"Error fetching orders: {e}")
+
     def calculate_portfolio_value(self):
         """
         Calculate the total portfolio value.
         """
         try:
-            account = self.api.get_account()
+            account = self.get_account_info()
             return float(account.portfolio_value)
-        except tradeapi.rest.APIError as e:
+        except Exception as e:
             raise Exception(f"Error fetching portfolio value: {e}")
 
-    def fetch_historical_data(self, symbol, start_date):
+    def fetch_historical_data(self, symbol, start_date, adjustment='all'):
+        """
+        Fetch daily bars from start_date through yesterday.
+        Bars already in the local cache are served from disk; only the tail after the
+        last cached date is requested from Alpaca.
+        """
         try:
             end_date = (date.today() - timedelta(days=1)).strftime("%Y-%m-%d")
-            bars = self.api.get_bars(
+            if self.bar_cache is None:
+                return self.__download_bars__(symbol, start_date, end_date, adjustment)
+
+            coverage = self.bar_cache.coverage(symbol, TimeFrame.Day, adjustment)
+            if coverage is None or start_date < coverage[0]:
+                bars = self.__download_bars__(symbol, start_date, end_date, adjustment)
+                self.bar_cache.store(symbol, TimeFrame.Day, adjustment, bars, start_date, end_date)
+            elif coverage[1] < end_date:
+                self.__refresh_tail__(symbol, coverage, end_date, adjustment)
+
+            return self.bar_cache.load(symbol, TimeFrame.Day, adjustment, start_date, end_date)
+        except Exception as e:
+            logger.error(f"Error fetching historical data for {symbol}: {e}")
+            raise
+
+    def __download_bars__(self, symbol, start_date, end_date, adjustment):
+        """
+        Pulls daily bars straight from the Alpaca data API.
+        """
+        bars = self.api.get_bars(
+            symbol,
+            TimeFrame.Day,
+            start=start_date,
+            end=end_date,
+            adjustment=adjustment
+        ).df
+        #logging.info(f"Data retrieved: {bars.tail(3)}")
+        return bars
+
+    def __refresh_tail__(self, symbol, coverage, end_date, adjustment, bars=None):
+        """
+        Fetches bars from the newest cached one onward (bars, if given, is that download, e.g.
+        from a batch request). The overlapping bar is compared with the cached one; if it moved
+        (a split or dividend re-adjusted the series) the key's whole history is downloaded again.
+        """
+        first_date = coverage[0]
+        newest = self.bar_cache.newest(symbol, TimeFrame.Day, adjustment)
+        if bars is None:
+            bars = self.__download_bars__(symbol, self.__tail_start__(newest, coverage), end_date, adjustment)
+        if not self.__tail_agrees__(newest, bars):
+            logger.info(f"Adjusted history changed for {symbol}, reloading cache from {first_date}")
+            self.bar_cache.clear(symbol, TimeFrame.Day, adjustment)
+            bars = self.__download_bars__(symbol, first_date, end_date, adjustment)
+        self.bar_cache.store(symbol, TimeFrame.Day, adjustment, bars, first_date, end_date)
+
+    def __tail_start__(self, newest, coverage):
+        """
+        Date to download a stale key's tail from: that of its newest cached bar, so the tail
+        overlaps it even when the coverage ends on a weekend or holiday.
+        """
+        return newest.index[-1].strftime("%Y-%m-%d") if not newest.empty else coverage[1]
+
+    def __tail_agrees__(self, newest, bars):
+        """
+        False if bars holds the newest cached bar's timestamp with different OHLC values.
+        """
+        if newest.empty or bars is None or bars.empty:
+            return True
+        overlap = bars[bars.index == newest.index[-1]]
+        if overlap.empty:
+            return True
+        fields = ['open', 'high', 'low', 'close']
+        return bool(np.allclose(newest[fields].to_numpy(dtype=float)[-1], overlap[fields].to_numpy(dtype=float)[-1],
+                                rtol=1e-9, atol=0.0))
+
+    def fetch_historical_batch(self, symbols, start_date, adjustment='all', chunk_size=200):
+        """
+        fetch_historical_data for many symbols, returned as {symbol: DataFrame}.
+        Symbols missing from the cache, or whose cache ends before yesterday, are downloaded
+        with one multi-symbol request per chunk_size symbols instead of one request each.
+        """
+        end_date = (date.today() - timedelta(days=1)).strftime("%Y-%m-%d")
+        if self.bar_cache is None:
+            return self.__download_batch__(symbols, start_date, end_date, adjustment, chunk_size)
+
+        missing, stale = [], {}
+        for symbol in symbols:
+            coverage = self.bar_cache.coverage(symbol, TimeFrame.Day, adjustment)
+            if coverage is None or start_date < coverage[0]:
+                missing.append(symbol)
+            elif coverage[1] < end_date:
+                tail_start = self.__tail_start__(self.bar_cache.newest(symbol, TimeFrame.Day, adjustment), coverage)
+                stale.setdefault((coverage, tail_start), []).append(symbol)
+
+        downloaded = self.__download_batch__(missing, start_date, end_date, adjustment, chunk_size)
+        for symbol in missing:  # symbols without bars are recorded too, so they are not asked for again
+            self.bar_cache.store(symbol, TimeFrame.Day, adjustment, downloaded.get(symbol), start_date, end_date)
+
+        for (coverage, tail_start), group in stale.items():
+            tails = self.__download_batch__(group, tail_start, end_date, adjustment, chunk_size)
+            for symbol in group:
+                self.__refresh_tail__(symbol, coverage, end_date, adjustment, tails.get(symbol, pd.DataFrame()))
+
+        return {symbol: self.bar_cache.load(symbol, TimeFrame.Day, adjustment, start_date, end_date) for symbol in symbols}
+
+    def __download_batch__(self, symbols, start_date, end_date, adjustment, chunk_size):
+        """
+        Multi-symbol get_bars, split back into one DataFrame per symbol.
+        """
+        bars = {}
+        for first in range(0, len(symbols), chunk_size):
+            chunk = symbols[first:first + chunk_size]
+            try:
+                frame = self.api.get_bars(chunk, TimeFrame.Day, start=start_date, end=end_date, adjustment=adjustment).df
+            except tradeapi.rest.APIError as e:
+                raise Exception(f"Error fetching historical data for {len(chunk)} symbols: {e}")
+            if frame.empty:
+                continue
+            for symbol, group in frame.groupby('symbol'):
+                bars[symbol] = group.drop(columns='symbol')
+        return bars
+
+    def fetch_tradable_symbols(self):
+        """
+        Symbols of every active, tradable US equity.
+        """
+        try:
+            assets = self.api.list_assets(status='active', asset_class='us_equity')
+            return sorted(asset.symbol for asset in assets if asset.tradable)
+        except tradeapi.rest.APIError as e:
+            raise Exception(f"Error fetching tradable assets: {e}")
+
+    def fetch_intraday_bars(self, symbol, start, end, bar_seconds=60):
+        """
+        Fetch intraday bars of bar_seconds length (a whole number of minutes) between two timestamps.
+        """
+        try:
+            timeframe = TimeFrame(max(bar_seconds // 60, 1), TimeFrameUnit.Minute)
+            return self.api.get_bars(
                 symbol,
-                TimeFrame.Day,
-                start=start_date,
-                end=end_date,
-                adjustment='all'
+                timeframe,
+                start=pd.Timestamp(start).isoformat(),
+                end=pd.Timestamp(end).isoformat(),
+                adjustment='raw',
+                feed='iex'
             ).df
-            #logging.info(f"Data retrieved: {bars.tail(3)}")
-            return bars
         except Exception as e:
-            logger.error(f"Error fetching historical data for {symbol}: {e}")
+            logger.error(f"Error fetching intraday bars for {symbol}: {e}")
             raise
 
     
@@ -162,43 +350,60 @@ class AlpacaAPI:
 
     
     
-    def fetch_all_transactions(self, status='filled', limit=200):
+    def fetch_all_transactions(self, status='filled', limit=None):
         """
-        Fetch all filled transactions from Alpaca.
+        Fetch all filled transactions from Alpaca, oldest first (the newest `limit` if given).
         """
-        try:
-            orders = self.api.list_orders(status=status, limit=limit)
-            transaction_data = []
-            for order in orders:
-                transaction_data.append({
-                    'symbol': order.symbol,
-                    'side': order.side,
-                    'price': float(order.filled_avg_price) if order.filled_avg_price else None,
-                    'qty': int(order.filled_qty) if order.filled_qty else None,
-                    'timestamp': order.filled_at
-                })
-            return transaction_data
-        except Exception as e:
-            logger.error(f"Error fetching transactions: {e}")
-            return []
+        if status != 'filled':
+            raise ValueError(f"Only filled transactions are recorded, not '{status}'")
+        self.sync_fills()
+        return self.ledger.transactions(limit=limit)
 
 
-    def is_market_open(self):
+    def get_clock(self):
         """
-        Check if the market is currently open.
+        Market clock, refetched only once the cached one has passed its next open or close.
         """
+        now = datetime.now(timezone.utc)
+        if self.clock is not None:
+            transition = self.clock.next_close if self.clock.is_open else self.clock.next_open
+            if now < transition:
+                return self.clock
         try:
-            clock = self.api.get_clock()
-            return clock.is_open
+            self.clock = self.api.get_clock()
+            return self.clock
         except tradeapi.rest.APIError as e:
             raise Exception(f"Error checking market status: {e}")
 
-    def get_account_info(self):
+    def is_market_open(self):
+        """
+        Check if the market is currently open.
+        """
+        return self.get_clock().is_open
+
+    def seconds_until_open(self):
+        """
+        Seconds until the next market open (0 while the market is open).
+        """
+        clock = self.get_clock()
+        if clock.is_open:
+            return 0.0
+        return max((clock.next_open - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+    def get_account_info(self, max_age=None):
         """
         Retrieve account details.
+        A copy younger than max_age seconds (default account_ttl) is reused; placing an
+        order or seeing a fill drops it.
         """
+        max_age = self.account_ttl if max_age is None else max_age
+        cached = self.account
+        if cached is not None and time.monotonic() - cached[0] <= max_age:
+            return cached[1]
         try:
-            return self.api.get_account()
+            account = self.api.get_account()
+            self.account = (time.monotonic(), account)
+            return account
         except tradeapi.rest.APIError as e:
             raise Exception(f"Error fetching account information: {e}")
 
@@ -1,6 +1,13 @@
 import numpy as np
 import pandas as pd
 import logging
+import threading
+from collections import OrderedDict
+from functools import partial
+from indicators import StreamingIndicators, IndicatorEngine, bar_set_key
+from strategies import Strategy, signal_series
+from UniverseScanner import pack_panels, FIELDS as PANEL_FIELDS
+from Metrics import metrics
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("BackTestManager")#="TradingBot"
@@ -8,24 +15,206 @@ logger.setLevel(logging.INFO)
 
 class BacktestManager:
 
-    def __init__(self, strategies, bot):
+    def __init__(self, strategies, bot, cache_size=4096):
+        """
+        Scores symbols with weighted strategies. Results are memoized per strategy and as the
+        weighted score, keyed by symbol, bar set (bar_set_key: length, first/last timestamp
+        and a fingerprint of the closes, so re-adjusted bars are scored afresh) and the
+        strategy's parameters, in LRUs of cache_size entries. A strategy that also reads
+        something other than the bars (e.g. the position sizing vote) is invalidated through
+        invalidate() or invalidate_on().
+        """
         self.strategies = strategies
         self.main_bot = bot
+        self.streams = {}  # symbol -> StreamingIndicators
+        self.cache_size = cache_size
+        self.results = OrderedDict()  # (symbol, bar set, strategy, params) -> result
+        self.scores = OrderedDict()  # (symbol, bar set) -> weighted score
+        self.cache_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
 
     def add_strategy(self, strategy):
         """
         Add a strategy to be used in backtests
         """
         self.strategies.append(strategy)
+        self.invalidate()
 
     def execute_strategies(self, symbol, data):
         logger.debug(f"Running backtesting strategies for {symbol}")
+        if isinstance(data, (StreamingIndicators, IndicatorEngine)) or getattr(data, 'index', None) is None:
+            return self.__score__(symbol, data, None)  # state that changes in place, nothing to key on
+        bars = bar_set_key(symbol, data)
+        with self.cache_lock:
+            score = self.scores.get(bars)
+            if score is not None:
+                self.scores.move_to_end(bars)
+                self.hits += 1
+                metrics.increment("score_cache.hit")
+                return score
+        score = self.__score__(symbol, data, bars)
+        with self.cache_lock:
+            self.__store__(self.scores, bars, score)
+        return score
+
+    def __score__(self, symbol, data, bars):
         total_score = 0
         total_weight = 0
-        
+
         for strategy, weight in self.strategies:
-            result = strategy(symbol, data)
+            result = self.__result__(symbol, data, bars, strategy)
             total_score += result * weight
             total_weight += weight
-        
+
         return total_score / total_weight if total_weight > 0 else 0
+
+    def __result__(self, symbol, data, bars, strategy):
+        key = (bars, strategy, strategy_params(strategy)) if bars is not None else None
+        if key is not None:
+            with self.cache_lock:
+                result = self.results.get(key)
+                if result is not None:
+                    self.results.move_to_end(key)
+                    self.hits += 1
+                    metrics.increment("score_cache.hit")
+                    return result
+        with metrics.timer(f"strategy.{getattr(strategy, '__name__', 'unnamed')}"):
+            result = strategy(symbol, data)
+        if key is not None:
+            with self.cache_lock:
+                self.misses += 1
+                metrics.increment("score_cache.miss")
+                self.__store__(self.results, key, result)
+        return result
+
+    def __store__(self, cache, key, value):
+        cache[key] = value
+        cache.move_to_end(key)
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+
+    def invalidate(self, strategy=None, symbol=None):
+        """
+        Forget memoized results of one strategy (or all), for one symbol (or all), and the
+        weighted scores built from them.
+        """
+        with self.cache_lock:
+            if strategy is None and symbol is None:
+                self.results.clear()
+                self.scores.clear()
+                return
+            for key in [key for key in self.results
+                        if (strategy is None or key[1] is strategy) and (symbol is None or key[0][0] == symbol)]:
+                del self.results[key]
+            for key in [key for key in self.scores if symbol is None or key[0] == symbol]:
+                del self.scores[key]
+
+    def invalidate_on(self, listeners, strategy):
+        """
+        Invalidate strategy for a symbol whenever a fill for it arrives, e.g.
+        invalidate_on(alpaca.ledger.listeners, sizing) for a vote that reads positions.
+        """
+        listeners.append(lambda fill: self.invalidate(strategy, fill['symbol']))
+
+    def cache_stats(self):
+        with self.cache_lock:
+            total = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / total if total else 0.0,
+                    'results': len(self.results), 'scores': len(self.scores)}
+
+
+    def requirements(self):
+        """
+        (lookback, fields) the strategy stack needs: the longest declared lookback (None if any
+        strategy reads the whole history) and the union of declared fields. Plain functions
+        are assumed to need every OHLC column and the whole history.
+        """
+        lookback, fields = 0, set()
+        for strategy, _ in self.strategies:
+            if not isinstance(strategy, Strategy):
+                lookback = None
+                fields.update(PANEL_FIELDS)
+                continue
+            if lookback is not None:
+                lookback = None if strategy.lookback is None else max(lookback, strategy.lookback)
+            fields.update(strategy.fields)
+        return lookback, tuple(field for field in PANEL_FIELDS if field in fields)
+
+    def evaluate(self, symbols, panel):
+        """
+        Weighted scores {symbol: score} for many symbols in one pass. panel maps symbol ->
+        bars (DataFrame or PriceHistory). Only the fields and trailing window the strategies
+        declare are packed into symbols x bars arrays; shared indicators are computed once
+        per array and every strategy with a signal series scores all of its rows in one
+        vectorized call. Other strategies (e.g. the position sizing vote) are called per
+        symbol. Matches execute_strategies for each symbol.
+        """
+        lookback, fields = self.requirements()
+        bars = {symbol: panel[symbol] for symbol in symbols if symbol in panel}
+        scores = {}
+        for group, arrays in pack_panels(bars, fields, lookback):
+            indicators = IndicatorEngine(arrays)
+            for strategy, _ in self.strategies:
+                for name, *args in getattr(strategy, 'indicators', ()):
+                    getattr(indicators, name)(*args)
+
+            total_score = np.zeros(len(group))
+            total_weight = 0
+            for strategy, weight in self.strategies:
+                series = signal_series(strategy)
+                with metrics.timer(f"strategy.{getattr(strategy, '__name__', 'unnamed')}"):
+                    if series is not None:
+                        result = np.nan_to_num(series(indicators)[..., -1])
+                    else:
+                        result = np.array([strategy(symbol, bars[symbol]) for symbol in group], dtype=float)
+                total_score += result * weight
+                total_weight += weight
+            if total_weight > 0:
+                total_score /= total_weight
+            scores.update(zip(group, total_score.tolist()))
+        metrics.increment("evaluate.symbols", len(scores))
+        return scores
+
+    def run_backtest(self, symbol, data, params=None, **settings):
+        """
+        Replay a bar history through this manager's weighted strategies with the bot's stop rules.
+        settings are passed to Backtester (buy_threshold, sell_threshold, cost, ...).
+        Returns equity curve, trades, drawdown and Sharpe; see Backtester.simulate.
+        """
+        from Backtester import Backtester
+        posman = getattr(self.main_bot, 'posman', None)
+        return Backtester(self.strategies, posman, **settings).run(symbol, data, params)
+
+    def on_bar(self, symbol, bar, history=None):
+        """
+        Advance the streaming indicator state for symbol by one bar.
+        history (a DataFrame of earlier bars) seeds the state the first time the symbol is seen.
+        """
+        state = self.streams.get(symbol)
+        if state is None:
+            state = StreamingIndicators(symbol)
+            if history is not None and not history.empty:
+                state.seed(history)
+            self.streams[symbol] = state
+        state.update(bar)
+        return state
+
+    def execute_streaming(self, symbol, bar, history=None):
+        """
+        Score symbol from its streaming state after applying the new bar, without
+        re-running the strategies over the full history.
+        """
+        state = self.on_bar(symbol, bar, history)
+        return self.execute_strategies(symbol, state)
+
+
+def strategy_params(strategy):
+    """
+    The parameters a strategy runs with: a partial's bound arguments, else its defaults.
+    """
+    if isinstance(strategy, partial):
+        return (strategy.args, tuple(sorted(strategy.keywords.items())), strategy_params(strategy.func))
+    defaults = getattr(strategy, '__defaults__', None)
+    kwdefaults = getattr(strategy, '__kwdefaults__', None)
+    return (defaults, tuple(sorted(kwdefaults.items())) if kwdefaults else None)
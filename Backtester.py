@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+import logging
+from indicators import IndicatorEngine
+from strategies import signal_series
+from Posman import Posman
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("Backtester")
+logger.setLevel(logging.INFO)
+
+TRADING_DAYS = 252
+
+
+class Backtester:
+    def __init__(self, strategies, posman=None, buy_threshold=0.25, sell_threshold=-0.45,
+                 risk_threshold=0.05, trailing_threshold=0.075, cost=0.0):
+        """
+        Walk-forward replay of a bar history through the weighted strategy list, using the same
+        entry/exit rules as TradingBot.monitor_market:
+            buy when the score is above buy_threshold,
+            sell when the score is below sell_threshold, the close breaks the Posman stop loss
+            on the entry price, or the close breaks the trailing stop below the bar's open.
+        Strategies are evaluated for every bar at once from their signal series.
+        Strategies without one (e.g. the position sizing lambda) are called once on the whole
+        history and held constant. cost is charged as a fraction of notional per fill.
+        """
+        self.strategies = strategies
+        self.posman = posman if posman is not None else Posman(None)
+        self.buy_threshold = buy_threshold
+        self.sell_threshold = sell_threshold
+        self.risk_threshold = risk_threshold
+        self.trailing_threshold = trailing_threshold
+        self.cost = cost
+
+    def score(self, indicators, symbol=None, data=None, params=None):
+        """
+        Weighted strategy score at every bar. params maps a strategy function's name to
+        keyword arguments for its signal series (e.g. {'rsi_strategy': {'overbought': 75}}).
+        """
+        params = params or {}
+        total_score = np.zeros(len(indicators))
+        total_weight = 0
+        for strategy, weight in self.strategies:
+            series = signal_series(strategy)
+            if series is not None:
+                signals = series(indicators, **params.get(strategy.__name__, {}))
+            else:
+                signals = strategy(symbol, data if data is not None else indicators)
+            total_score += np.nan_to_num(signals) * weight
+            total_weight += weight
+        return total_score / total_weight if total_weight > 0 else total_score
+
+    def run(self, symbol, data, params=None):
+        """
+        Backtest one symbol over a DataFrame (or mapping of arrays) of bars.
+        """
+        indicators = IndicatorEngine(data)
+        score = self.score(indicators, symbol, data, params)
+        result = self.simulate(indicators.column('open'), indicators.column('close'), score)
+        result['symbol'] = symbol
+        result['index'] = getattr(data, 'index', None)
+        return result
+
+    def run_store(self, store, symbols=None, start=None, end=None, timeframe='1Day', params=None):
+        """
+        Backtest symbols (default: every one stored) straight from a ColumnStore, one symbol at
+        a time on its memory-mapped slice, so the dataset never has to fit in memory.
+        Yields one run() result per symbol with bars between start and end.
+        """
+        for symbol, window in store.slices(symbols, start, end, timeframe).items():
+            result = self.run(symbol, window, params)
+            result['index'] = pd.DatetimeIndex(pd.to_datetime(np.asarray(window['timestamp']), utc=True), name='timestamp')
+            yield result
+
+    def simulate(self, open_prices, close, score):
+        """
+        Long/flat simulation over aligned bar arrays (one position per symbol rather than the
+        bot's one-share adds). Fills happen at the close of the signal bar.
+        Only the trade boundaries are walked in Python; finding each next entry and exit is a
+        NumPy search over precomputed boolean arrays, so cost grows with trades, not bars.
+        """
+        n = len(close)
+        entries = score > self.buy_threshold
+        trailing_stop = self.posman.calculate_stop_loss(open_prices, self.trailing_threshold)
+        forced_exits = (score < self.sell_threshold) | (close < trailing_stop)
+
+        next_entry = __next_true__(entries)
+        next_exit = __next_true__(forced_exits)
+
+        trades = []
+        holding = np.zeros(n + 1)
+        start = 0
+        while start < n:
+            entry = next_entry[start]
+            if entry >= n:
+                break
+            entry_price = close[entry]
+            stop_price = self.posman.calculate_stop_loss(entry_price, self.risk_threshold)
+
+            forced = next_exit[entry + 1] if entry + 1 < n else n
+            stopped = np.flatnonzero(close[entry + 1:forced] < stop_price)
+            if stopped.size:
+                exit_, reason = entry + 1 + stopped[0], 'stop_loss'
+            elif forced < n:
+                exit_, reason = forced, 'signal' if score[forced] < self.sell_threshold else 'trailing_stop'
+            else:
+                exit_, reason = None, 'open'
+
+            last = exit_ if exit_ is not None else n - 1
+            trades.append({
+                'entry_bar': int(entry),
+                'exit_bar': None if exit_ is None else int(exit_),
+                'entry_price': float(entry_price),
+                'exit_price': float(close[last]),
+                'return': float(close[last] / entry_price - 1),
+                'reason': reason,
+            })
+            holding[entry + 1] += 1
+            holding[last + 1] -= 1
+            if exit_ is None:
+                break
+            start = exit_ + 1
+
+        position = np.cumsum(holding[:n])
+        bar_returns = np.zeros(n)
+        if n > 1:
+            bar_returns[1:] = close[1:] / close[:-1] - 1
+        strategy_returns = position * bar_returns
+        for trade in trades:
+            strategy_returns[trade['entry_bar']] -= self.cost
+            if trade['exit_bar'] is not None:
+                strategy_returns[trade['exit_bar']] -= self.cost
+
+        equity = np.cumprod(1 + strategy_returns)
+        drawdown = equity / np.maximum.accumulate(equity) - 1 if n else equity
+        volatility = strategy_returns.std(ddof=1) if n > 1 else 0.0
+        closed = [t for t in trades if t['exit_bar'] is not None]
+        return {
+            'score': score,
+            'position': position,
+            'returns': strategy_returns,
+            'equity': equity,
+            'drawdown': drawdown,
+            'trades': trades,
+            'total_return': float(equity[-1] - 1) if n else 0.0,
+            'max_drawdown': float(drawdown.min()) if n else 0.0,
+            'sharpe': float(strategy_returns.mean() / volatility * np.sqrt(TRADING_DAYS)) if volatility > 0 else 0.0,
+            'win_rate': float(np.mean([t['return'] > 0 for t in closed])) if closed else 0.0,
+        }
+
+
+def __next_true__(mask):
+    """
+    For every bar i, the index of the first True at or after i (len(mask) if none).
+    """
+    n = len(mask)
+    positions = np.where(mask, np.arange(n), n)
+    return np.minimum.accumulate(positions[::-1])[::-1] if n else positions
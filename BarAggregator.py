@@ -0,0 +1,151 @@
+import logging
+import pandas as pd
+from PriceHistory import PriceHistory
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("BarAggregator")
+logger.setLevel(logging.INFO)
+
+# Timeframe name -> bar length in seconds; '1d' buckets by the exchange's calendar date.
+TIMEFRAMES = {'1m': 60, '5m': 300, '15m': 900, '1h': 3600, '1d': None}
+MARKET_TZ = 'America/New_York'
+
+
+class BarAggregator:
+    def __init__(self, timeframes=TIMEFRAMES, length=500):
+        """
+        Builds bars of every timeframe at once from a single feed of trades or one-minute bars.
+        Each symbol keeps the last `length` completed bars per timeframe in a PriceHistory ring
+        plus the bar still being built, so strategies can ask for 5-minute or hourly history
+        without another API call.
+        """
+        self.timeframes = dict(timeframes)
+        self.length = length
+        self.history = {}  # (symbol, timeframe) -> PriceHistory of completed bars
+        self.open_bars = {}  # (symbol, timeframe) -> bar being built
+        self.starts = {}  # (symbol, timeframe) -> start of the open bar, epoch seconds
+        self.listeners = []  # called with (symbol, timeframe, bar) for every completed bar
+        self.last_bar = {}  # symbol -> timestamp (ns) of the newest bar merged by add_bar
+        self.__day__ = (0, 0)  # [start, end) of the last trading day looked up, epoch seconds
+
+    def bucket(self, timestamp, timeframe):
+        """
+        Start of the timeframe bar containing timestamp.
+        """
+        timestamp = __utc__(timestamp)
+        return pd.Timestamp(self.__starts__(timestamp)[timeframe], unit='s', tz='UTC')
+
+    def __starts__(self, timestamp):
+        """
+        Bar start (epoch seconds) of every timeframe for a UTC timestamp.
+        """
+        seconds = timestamp.value // 1_000_000_000
+        starts = {}
+        for timeframe, length in self.timeframes.items():
+            if length is None:
+                if not self.__day__[0] <= seconds < self.__day__[1]:
+                    midnight = timestamp.tz_convert(MARKET_TZ).normalize()
+                    following = midnight + pd.DateOffset(days=1)  # calendar day, DST days are not 24h
+                    self.__day__ = (midnight.value // 1_000_000_000, following.value // 1_000_000_000)
+                starts[timeframe] = self.__day__[0]
+            else:
+                starts[timeframe] = seconds - seconds % length
+        return starts
+
+    def add_trade(self, symbol, price, size, timestamp):
+        """
+        Folds one trade into every timeframe. Returns [(timeframe, bar)] of bars it completed.
+        """
+        return self.__merge__(symbol, {'open': price, 'high': price, 'low': price, 'close': price,
+                                       'volume': size, 'timestamp': timestamp}, __utc__(timestamp))
+
+    def add_bar(self, symbol, bar):
+        """
+        Folds one bar (at most as long as the shortest timeframe, e.g. a streamed or polled
+        one-minute bar) into every timeframe. A bar no newer than the last one added for the
+        symbol (e.g. the same bar polled twice) is ignored.
+        Returns [(timeframe, bar)] of bars it completed.
+        """
+        timestamp = __utc__(bar['timestamp'])
+        if timestamp.value <= self.last_bar.get(symbol, -1):
+            return []
+        self.last_bar[symbol] = timestamp.value
+        return self.__merge__(symbol, bar, timestamp)
+
+    def __merge__(self, symbol, bar, timestamp):
+        completed = []
+        for timeframe, start in self.__starts__(timestamp).items():
+            key = (symbol, timeframe)
+            current = self.open_bars.get(key)
+            if current is not None and start < self.starts[key]:
+                continue
+            if current is not None and start == self.starts[key]:
+                current['high'] = max(current['high'], bar['high'])
+                current['low'] = min(current['low'], bar['low'])
+                current['close'] = bar['close']
+                current['volume'] += bar['volume']
+                continue
+            if current is not None:
+                self.__close__(symbol, timeframe, current)
+                completed.append((timeframe, current))
+            self.starts[key] = start
+            self.open_bars[key] = {'open': bar['open'], 'high': bar['high'], 'low': bar['low'], 'close': bar['close'],
+                                   'volume': bar['volume'], 'timestamp': pd.Timestamp(start, unit='s', tz='UTC')}
+        for timeframe, closed in completed:
+            for listener in self.listeners:
+                listener(symbol, timeframe, closed)
+        return completed
+
+    def __close__(self, symbol, timeframe, bar):
+        history = self.history.get((symbol, timeframe))
+        if history is None:
+            history = self.history[(symbol, timeframe)] = PriceHistory(symbol, self.length)
+        history.append(self.starts[(symbol, timeframe)] * 1_000_000_000,
+                       bar['open'], bar['high'], bar['low'], bar['close'], bar['volume'])
+
+    def seed(self, symbol, bars):
+        """
+        Replays a DataFrame of one-minute bars (e.g. from fetch_intraday_bars) for symbol.
+        """
+        for timestamp, row in zip(bars.index, bars[['open', 'high', 'low', 'close', 'volume']].itertuples(index=False)):
+            self.add_bar(symbol, {'open': row.open, 'high': row.high, 'low': row.low, 'close': row.close,
+                                  'volume': row.volume, 'timestamp': timestamp})
+
+    def current(self, symbol, timeframe):
+        """
+        The bar still being built, or None.
+        """
+        return self.open_bars.get((symbol, timeframe))
+
+    def bars(self, symbol, timeframe):
+        """
+        Completed bars for symbol at timeframe, oldest first, as a PriceHistory that strategies
+        read directly (no copy).
+        """
+        history = self.history.get((symbol, timeframe))
+        if history is None:
+            history = self.history[(symbol, timeframe)] = PriceHistory(symbol, self.length)
+        return history
+
+    def frame(self, symbol, timeframe, include_open=False):
+        """
+        bars() as a DataFrame shaped like fetch_historical_data output. include_open appends
+        the bar still being built.
+        """
+        frame = self.bars(symbol, timeframe).frame()
+        current = self.open_bars.get((symbol, timeframe))
+        if include_open and current is not None:
+            frame.loc[current['timestamp']] = [current[field] for field in frame.columns]
+        return frame
+
+    def day_open(self, symbol):
+        """
+        Opening price of the current trading day, or None.
+        """
+        bar = self.open_bars.get((symbol, '1d'))
+        return bar['open'] if bar is not None else None
+
+
+def __utc__(timestamp):
+    timestamp = pd.Timestamp(timestamp)
+    return (timestamp.tz_convert('UTC') if timestamp.tzinfo else timestamp.tz_localize('UTC')).as_unit('ns')
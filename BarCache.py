@@ -0,0 +1,137 @@
+import sqlite3
+import threading
+import logging
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("BarCache")
+logger.setLevel(logging.INFO)
+
+BAR_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'trade_count', 'vwap']
+
+
+class BarCache:
+    def __init__(self, path="bar_cache.db"):
+        """
+        Local SQLite store of historical bars, keyed by symbol, timeframe and adjustment mode.
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS bars (
+                    symbol TEXT NOT NULL,
+                    timeframe TEXT NOT NULL,
+                    adjustment TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    open REAL, high REAL, low REAL, close REAL,
+                    volume REAL, trade_count REAL, vwap REAL,
+                    PRIMARY KEY (symbol, timeframe, adjustment, timestamp)
+                )
+                """
+            )
+            # first_date records how far back a key has been fetched, so a request that
+            # starts earlier than anything cached knows it has to go back to the API.
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS coverage (
+                    symbol TEXT NOT NULL,
+                    timeframe TEXT NOT NULL,
+                    adjustment TEXT NOT NULL,
+                    first_date TEXT NOT NULL,
+                    last_date TEXT NOT NULL,
+                    PRIMARY KEY (symbol, timeframe, adjustment)
+                )
+                """
+            )
+
+    def coverage(self, symbol, timeframe, adjustment):
+        """
+        Returns the (first_date, last_date) range already fetched for a key, or None.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT first_date, last_date FROM coverage WHERE symbol=? AND timeframe=? AND adjustment=?",
+                (symbol, str(timeframe), adjustment),
+            ).fetchone()
+        return row
+
+    def store(self, symbol, timeframe, adjustment, bars, first_date, last_date):
+        """
+        Upserts a bars DataFrame (as returned by get_bars().df) and extends the coverage range.
+        """
+        rows = []
+        if bars is not None and not bars.empty:
+            frame = bars.reindex(columns=BAR_COLUMNS)
+            for ts, values in zip(frame.index, frame.itertuples(index=False, name=None)):
+                rows.append((symbol, str(timeframe), adjustment, pd.Timestamp(ts).isoformat()) + tuple(values))
+
+        with self.lock, self.conn:
+            if rows:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO bars VALUES (?,?,?,?,?,?,?,?,?,?,?)", rows
+                )
+            self.conn.execute(
+                """
+                INSERT INTO coverage VALUES (?,?,?,?,?)
+                ON CONFLICT(symbol, timeframe, adjustment) DO UPDATE SET
+                    first_date=MIN(first_date, excluded.first_date),
+                    last_date=MAX(last_date, excluded.last_date)
+                """,
+                (symbol, str(timeframe), adjustment, first_date, last_date),
+            )
+
+    def load(self, symbol, timeframe, adjustment, start_date, end_date):
+        """
+        Returns cached bars between start_date and end_date (inclusive, YYYY-MM-DD) as a DataFrame
+        shaped like get_bars().df.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                """
+                SELECT timestamp, open, high, low, close, volume, trade_count, vwap FROM bars
+                WHERE symbol=? AND timeframe=? AND adjustment=? AND substr(timestamp, 1, 10) BETWEEN ? AND ?
+                ORDER BY timestamp
+                """,
+                (symbol, str(timeframe), adjustment, start_date, end_date),
+            ).fetchall()
+        return __frame__(rows)
+
+    def newest(self, symbol, timeframe, adjustment):
+        """
+        The newest cached bar for a key as a one-row DataFrame shaped like load(), empty if none.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                """
+                SELECT timestamp, open, high, low, close, volume, trade_count, vwap FROM bars
+                WHERE symbol=? AND timeframe=? AND adjustment=?
+                ORDER BY timestamp DESC LIMIT 1
+                """,
+                (symbol, str(timeframe), adjustment),
+            ).fetchall()
+        return __frame__(rows)
+
+    def clear(self, symbol=None, timeframe=None, adjustment=None):
+        """
+        Drops cached bars: everything, one symbol, or one (symbol, timeframe, adjustment) key.
+        """
+        with self.lock, self.conn:
+            if symbol is None:
+                self.conn.execute("DELETE FROM bars")
+                self.conn.execute("DELETE FROM coverage")
+            elif timeframe is None:
+                self.conn.execute("DELETE FROM bars WHERE symbol=?", (symbol,))
+                self.conn.execute("DELETE FROM coverage WHERE symbol=?", (symbol,))
+            else:
+                key = (symbol, str(timeframe), adjustment)
+                self.conn.execute("DELETE FROM bars WHERE symbol=? AND timeframe=? AND adjustment=?", key)
+                self.conn.execute("DELETE FROM coverage WHERE symbol=? AND timeframe=? AND adjustment=?", key)
+
+
+def __frame__(rows):
+    bars = pd.DataFrame(rows, columns=['timestamp'] + BAR_COLUMNS)
+    bars.index = pd.DatetimeIndex(pd.to_datetime(bars.pop('timestamp'), utc=True), name='timestamp')
+    return bars
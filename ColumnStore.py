@@ -0,0 +1,168 @@
+import logging
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("ColumnStore")
+logger.setLevel(logging.INFO)
+
+BAR_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'trade_count', 'vwap']
+
+
+class ColumnStore:
+    def __init__(self, root="bar_store", fields=BAR_COLUMNS):
+        """
+        Append-only columnar bar store on disk: root/<timeframe>/<symbol>/ holds one raw
+        little-endian array file per field (float64) plus timestamp.i8 (int64 ns, UTC, strictly
+        increasing). Reads are memory-mapped, so slicing years of minute bars costs a binary
+        search on the timestamp column and no copying; pages are read only when touched.
+        """
+        self.root = root
+        self.fields = list(fields)
+        self.lock = threading.Lock()
+        self.maps = {}  # (symbol, timeframe) -> (rows, {field: memmap})
+
+    def __symbol_dir__(self, symbol, timeframe):
+        return os.path.join(self.root, timeframe, symbol)
+
+    def __path__(self, symbol, timeframe, field):
+        suffix = 'i8' if field == 'timestamp' else 'f8'
+        return os.path.join(self.__symbol_dir__(symbol, timeframe), f"{field}.{suffix}")
+
+    def __len_on_disk__(self, symbol, timeframe):
+        # timestamp.i8 is written last, so it never claims rows whose fields are missing
+        try:
+            return os.path.getsize(self.__path__(symbol, timeframe, 'timestamp')) // 8
+        except FileNotFoundError:
+            return 0
+
+    def symbols(self, timeframe='1Day'):
+        path = os.path.join(self.root, timeframe)
+        return sorted(os.listdir(path)) if os.path.isdir(path) else []
+
+    def rows(self, symbol, timeframe='1Day'):
+        return self.__len_on_disk__(symbol, timeframe)
+
+    def append(self, symbol, bars, timeframe='1Day'):
+        """
+        Appends a DataFrame of bars (DatetimeIndex, BAR_COLUMNS). Bars at or before the last
+        stored timestamp are skipped. Returns the number of rows written.
+        """
+        if bars is None or bars.empty:
+            return 0
+        timestamps = pd.DatetimeIndex(bars.index)
+        timestamps = (timestamps.tz_convert('UTC') if timestamps.tz else timestamps.tz_localize('UTC')).as_unit('ns').asi8
+        with self.lock:
+            last = self.last_timestamp(symbol, timeframe)
+            keep = timestamps > last.value if last is not None else np.ones(len(timestamps), dtype=bool)
+            if not keep.any():
+                return 0
+            timestamps = timestamps[keep]
+            if np.any(np.diff(timestamps) <= 0):
+                raise ValueError(f"Bars for {symbol} are not in strictly increasing time order")
+
+            os.makedirs(self.__symbol_dir__(symbol, timeframe), exist_ok=True)
+            rows = self.__len_on_disk__(symbol, timeframe)
+            frame = bars.reindex(columns=self.fields)[keep]
+            for field in self.fields:
+                self.__write__(symbol, timeframe, field, rows, frame[field].to_numpy(dtype='<f8'))
+            self.__write__(symbol, timeframe, 'timestamp', rows, timestamps.astype('<i8'))
+            self.maps.pop((symbol, timeframe), None)
+        return len(timestamps)
+
+    def __write__(self, symbol, timeframe, field, rows, values):
+        path = self.__path__(symbol, timeframe, field)
+        with open(path, 'ab') as handle:
+            handle.truncate(rows * 8)  # drop the tail of an interrupted append
+            handle.write(values.tobytes())
+
+    def last_timestamp(self, symbol, timeframe='1Day'):
+        rows = self.__len_on_disk__(symbol, timeframe)
+        if not rows:
+            return None
+        with open(self.__path__(symbol, timeframe, 'timestamp'), 'rb') as handle:
+            handle.seek((rows - 1) * 8)
+            return pd.Timestamp(int(np.frombuffer(handle.read(8), dtype='<i8')[0]), tz='UTC')
+
+    def columns(self, symbol, timeframe='1Day'):
+        """
+        Every stored row as {field: read-only memmap}, including 'timestamp'.
+        """
+        rows = self.__len_on_disk__(symbol, timeframe)
+        cached = self.maps.get((symbol, timeframe))
+        if cached is not None and cached[0] == rows:
+            return cached[1]
+        columns = {}
+        for field in ['timestamp'] + self.fields:
+            dtype = '<i8' if field == 'timestamp' else '<f8'
+            if rows:
+                columns[field] = np.memmap(self.__path__(symbol, timeframe, field), dtype=dtype, mode='r', shape=(rows,))
+            else:
+                columns[field] = np.empty(0, dtype=dtype)
+        self.maps[(symbol, timeframe)] = (rows, columns)
+        return columns
+
+    def slice(self, symbol, start=None, end=None, timeframe='1Day'):
+        """
+        Bars with start <= timestamp <= end as {field: memmap view}, found by binary search on
+        the timestamp column. The result works anywhere a mapping of bar arrays does
+        (IndicatorEngine, Backtester.run).
+        """
+        columns = self.columns(symbol, timeframe)
+        timestamps = columns['timestamp']
+        first = 0 if start is None else np.searchsorted(timestamps, __ns__(start), side='left')
+        last = len(timestamps) if end is None else np.searchsorted(timestamps, __ns__(end), side='right')
+        return {field: values[first:last] for field, values in columns.items()}
+
+    def slices(self, symbols=None, start=None, end=None, timeframe='1Day'):
+        """
+        {symbol: slice()} for symbols (default: every stored one) with bars in [start, end].
+        Nothing is read until a caller touches the arrays, so this is how Backtester.run_store
+        and ParameterSweep take a dataset larger than memory.
+        """
+        slices = {}
+        for symbol in (symbols if symbols is not None else self.symbols(timeframe)):
+            window = self.slice(symbol, start, end, timeframe)
+            if len(window['timestamp']):
+                slices[symbol] = window
+        return slices
+
+    def frame(self, symbol, start=None, end=None, timeframe='1Day'):
+        """
+        slice() copied into a DataFrame shaped like AlpacaAPI.fetch_historical_data output.
+        """
+        columns = self.slice(symbol, start, end, timeframe)
+        index = pd.DatetimeIndex(pd.to_datetime(np.asarray(columns['timestamp']), utc=True), name='timestamp')
+        return pd.DataFrame({field: np.array(columns[field]) for field in self.fields}, index=index)
+
+    def ingest(self, alpaca, symbol, start, end, bar_seconds=60):
+        """
+        Pulls intraday bars newer than what is stored through alpaca.fetch_intraday_bars and
+        appends them. Returns the number of new rows.
+        """
+        timeframe = f"{bar_seconds // 60}Min"
+        start, end = pd.Timestamp(__ns__(start), tz='UTC'), pd.Timestamp(__ns__(end), tz='UTC')
+        last = self.last_timestamp(symbol, timeframe)
+        if last is not None:
+            start = max(start, last + pd.Timedelta(seconds=bar_seconds))
+        if start > end:
+            return 0
+        return self.append(symbol, alpaca.fetch_intraday_bars(symbol, start, end, bar_seconds), timeframe)
+
+
+def __ns__(timestamp):
+    timestamp = pd.Timestamp(timestamp)
+    return (timestamp.tz_convert('UTC') if timestamp.tzinfo else timestamp.tz_localize('UTC')).as_unit('ns').value
+
+
+# Example usage
+if __name__ == "__main__":
+    from SimBroker import synthetic_bars
+
+    store = ColumnStore("bar_store")
+    for symbol, bars in synthetic_bars(["AAPL", "MSFT"], length=390 * 250, freq="min").items():
+        store.append(symbol, bars, "1Min")
+    window = store.slice("AAPL", "2024-11-01", "2024-11-30", "1Min")
+    print(len(window['close']), window['close'][:5])
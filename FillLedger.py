@@ -0,0 +1,223 @@
+import sqlite3
+import threading
+import logging
+from collections import defaultdict
+import pandas as pd
+from LotBook import LotBook
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("FillLedger")
+logger.setLevel(logging.INFO)
+
+PAGE_SIZE = 500  # Alpaca's maximum for list_orders
+
+
+class FillLedger:
+    def __init__(self, path="fill_ledger.db"):
+        """
+        Local SQLite ledger of filled orders, keyed by order id.
+        sync() only asks Alpaca for orders submitted after the last one it has seen, paging
+        through list_orders until history is complete. Fills are indexed per symbol in memory:
+        checkbook (distinct buy prices), sold_book (latest sell) and a FIFO LotBook, so
+        cost_basis() is O(1).
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS fills (
+                    order_id TEXT PRIMARY KEY,
+                    symbol TEXT NOT NULL,
+                    side TEXT NOT NULL,
+                    qty REAL NOT NULL,
+                    price REAL NOT NULL,
+                    submitted_at TEXT NOT NULL,
+                    filled_at TEXT NOT NULL
+                )
+                """
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS fills_by_symbol ON fills (symbol, filled_at)")
+            # cursor: submitted_at of the newest order that no longer needs rechecking
+            self.conn.execute("CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT)")
+
+        self.checkbook = defaultdict(list)  # symbol -> distinct buy prices, in fill order
+        self.sold_book = {}  # symbol -> {'sell_price', 'timestamp'} of the latest sell
+        self.lots = LotBook('fifo')
+        self.listeners = []  # called with each new fill dict, in fill order
+        self.__buy_prices__ = defaultdict(set)
+        self.__order_ids__ = set()
+
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT order_id, symbol, side, qty, price, filled_at FROM fills ORDER BY filled_at, order_id"
+            ).fetchall()
+        for order_id, symbol, side, qty, price, filled_at in rows:
+            self.__index__({'order_id': order_id, 'symbol': symbol, 'side': side, 'qty': qty,
+                            'price': price, 'timestamp': pd.Timestamp(filled_at)})
+
+    def cursor(self):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM sync_state WHERE key='cursor'").fetchone()
+        return row[0] if row else None
+
+    def sync(self, api):
+        """
+        Pulls orders submitted since the cursor from an alpaca_trade_api REST client and records
+        new fills. Returns the list of new fills.
+        """
+        cursor = self.cursor()
+        # An order still working may fill later, so the cursor never moves past the oldest one.
+        open_orders = api.list_orders(status='open', limit=PAGE_SIZE, direction='asc')
+        oldest_open = min((__iso__(order.submitted_at) for order in open_orders), default=None)
+
+        new_fills = []
+        seen = set()
+        newest = cursor
+        after = cursor
+        while True:
+            page = api.list_orders(status='closed', limit=PAGE_SIZE, after=after, direction='asc')
+            fresh = [order for order in page if order.id not in seen]
+            seen.update(order.id for order in fresh)
+            for order in fresh:
+                newest = max(newest or '', __iso__(order.submitted_at))
+                if order.id in self.__order_ids__ or not order.filled_at or not order.filled_avg_price:
+                    continue
+                new_fills.append({
+                    'order_id': order.id,
+                    'symbol': order.symbol,
+                    'side': order.side,
+                    'qty': float(order.filled_qty),
+                    'price': float(order.filled_avg_price),
+                    'submitted_at': __iso__(order.submitted_at),
+                    'timestamp': pd.Timestamp(order.filled_at),
+                })
+            if len(page) < PAGE_SIZE or not fresh:
+                break
+            # `after` is exclusive: step back 1us so orders sharing the boundary timestamp are not skipped
+            after = __before__(__iso__(page[-1].submitted_at))
+
+        if oldest_open is not None and (newest is None or oldest_open <= newest):
+            newest = __before__(oldest_open)
+        self.record(new_fills, cursor=newest)
+        if new_fills:
+            logger.info(f"Recorded {len(new_fills)} new fills")
+        return new_fills
+
+    def record(self, fills, cursor=None):
+        """
+        Stores fills (dicts with order_id, symbol, side, qty, price, timestamp) that are not
+        already in the ledger and updates the per-symbol index. The check, the insert and the
+        index happen under one lock, so a fill recorded by two threads at once (sync and an
+        order update) is booked once, and listeners only hear about the fills inserted here.
+        """
+        with self.lock, self.conn:
+            fresh = {}
+            for fill in fills:
+                if fill['order_id'] not in self.__order_ids__:
+                    fresh.setdefault(fill['order_id'], fill)
+            fills = sorted(fresh.values(), key=lambda fill: fill['timestamp'])
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO fills VALUES (?,?,?,?,?,?,?)",
+                [(fill['order_id'], fill['symbol'], fill['side'], fill['qty'], fill['price'],
+                  fill.get('submitted_at') or fill['timestamp'].isoformat(), fill['timestamp'].isoformat())
+                 for fill in fills],
+            )
+            if cursor is not None:
+                self.conn.execute("INSERT OR REPLACE INTO sync_state VALUES ('cursor', ?)", (cursor,))
+            for fill in fills:
+                self.__index__(fill)
+                logger.debug(f"Recorded {fill['side']} fill of {fill['qty']} {fill['symbol']} at {fill['price']}")
+        for fill in fills:
+            for listener in self.listeners:
+                listener(fill)
+
+    def __index__(self, fill):
+        symbol, qty, price = fill['symbol'], fill['qty'], fill['price']
+        self.__order_ids__.add(fill['order_id'])
+        if fill['side'] == 'buy':
+            if symbol not in self.checkbook:
+                self.__buy_prices__[symbol].clear()  # the bot dropped this symbol after selling out
+            if price not in self.__buy_prices__[symbol]:
+                self.__buy_prices__[symbol].add(price)
+                self.checkbook[symbol].append(price)
+        else:
+            self.sold_book[symbol] = {'sell_price': price, 'timestamp': fill['timestamp']}
+        self.lots.apply(symbol, fill['side'], qty, price, fill['timestamp'])
+
+    def restore_checkbook(self, symbol):
+        """
+        Rebuilds symbol's checkbook entry (distinct buy prices, in fill order) from the stored
+        fills, e.g. after the bot dropped it on a sell that left shares open.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT price FROM fills WHERE symbol=? AND side='buy' ORDER BY filled_at, order_id", (symbol,)
+            ).fetchall()
+        prices = list(dict.fromkeys(price for price, in rows))
+        self.__buy_prices__[symbol] = set(prices)
+        if prices:
+            self.checkbook[symbol] = prices
+        else:
+            self.checkbook.pop(symbol, None)
+        return prices
+
+    def cost_basis(self, symbol):
+        """
+        Average cost per share of the open FIFO lots, or None when flat.
+        """
+        return self.lots.cost_basis(symbol)
+
+    def fills(self):
+        """
+        Every recorded fill, oldest first, as the dicts record() takes.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT order_id, symbol, side, qty, price, submitted_at, filled_at FROM fills ORDER BY filled_at, order_id"
+            ).fetchall()
+        return [{'order_id': order_id, 'symbol': symbol, 'side': side, 'qty': qty, 'price': price,
+                 'submitted_at': submitted_at, 'timestamp': pd.Timestamp(filled_at)}
+                for order_id, symbol, side, qty, price, submitted_at, filled_at in rows]
+
+    def transactions(self, symbol=None, limit=None):
+        """
+        Recorded fills, oldest first, shaped like AlpacaAPI.fetch_all_transactions output.
+        limit keeps only the newest `limit` fills.
+        """
+        query = "SELECT symbol, side, price, qty, filled_at FROM fills"
+        params = ()
+        if symbol is not None:
+            query += " WHERE symbol=?"
+            params = (symbol,)
+        query += " ORDER BY filled_at, order_id"
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        if limit is not None:
+            rows = rows[-limit:]
+        return [{'symbol': symbol, 'side': side, 'price': price, 'qty': qty, 'timestamp': pd.Timestamp(filled_at)}
+                for symbol, side, price, qty, filled_at in rows]
+
+    def clear(self):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM fills")
+            self.conn.execute("DELETE FROM sync_state")
+        self.checkbook.clear()
+        self.sold_book.clear()
+        self.lots = LotBook('fifo')
+        self.__buy_prices__.clear()
+        self.__order_ids__.clear()
+
+
+def __iso__(timestamp):
+    timestamp = pd.Timestamp(timestamp)
+    timestamp = timestamp.tz_convert('UTC') if timestamp.tzinfo else timestamp.tz_localize('UTC')
+    return timestamp.isoformat()
+
+
+def __before__(iso):
+    """
+    The instant just before an ISO timestamp, so an `after` filter still includes it.
+    """
+    return (pd.Timestamp(iso) - pd.Timedelta(microseconds=1)).isoformat()
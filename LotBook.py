@@ -0,0 +1,178 @@
+import logging
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("LotBook")
+logger.setLevel(logging.INFO)
+
+METHODS = ('fifo', 'average')
+
+
+class Lots:
+    __slots__ = ('qty', 'price', 'time', 'head', 'tail')
+
+    def __init__(self, capacity=8):
+        """
+        Open lots of one symbol in parallel arrays; lots[head:tail] are live, oldest first.
+        """
+        self.qty = np.zeros(capacity)
+        self.price = np.zeros(capacity)
+        self.time = np.zeros(capacity, dtype='int64')  # ns since epoch
+        self.head = 0
+        self.tail = 0
+
+    def __len__(self):
+        return self.tail - self.head
+
+    def append(self, qty, price, time):
+        if self.tail == len(self.qty):
+            live = self.tail - self.head
+            capacity = max(len(self.qty), live * 2, 8)
+            for name in ('qty', 'price', 'time'):
+                old = getattr(self, name)
+                new = np.zeros(capacity, dtype=old.dtype)
+                new[:live] = old[self.head:self.tail]
+                setattr(self, name, new)
+            self.head, self.tail = 0, live
+        self.qty[self.tail] = qty
+        self.price[self.tail] = price
+        self.time[self.tail] = time
+        self.tail += 1
+
+    def view(self):
+        """
+        (qty, price, time) arrays of the live lots, without copying.
+        """
+        return self.qty[self.head:self.tail], self.price[self.head:self.tail], self.time[self.head:self.tail]
+
+
+class LotBook:
+    def __init__(self, method='fifo'):
+        """
+        Cost basis for the whole book, updated one fill at a time.
+        method is 'fifo' (sells close the oldest lots first) or 'average' (every symbol is one
+        lot at its average cost). Per-symbol open quantity and cost, and book-wide cost,
+        market value and realized P&L, are running totals, so valuing the book never rescans
+        lots or calls the API. cash is None until set, then moves with every fill.
+        """
+        if method not in METHODS:
+            raise ValueError(f"Unknown cost basis method '{method}', expected one of {METHODS}")
+        self.method = method
+        self.lots = {}  # symbol -> Lots
+        self.open_qty = {}
+        self.open_cost = {}
+        self.last_price = {}  # mark used for market value
+        self.realized = {}
+        self.total_cost = 0.0
+        self.market_value = 0.0
+        self.total_realized = 0.0
+        self.cash = None
+
+    def __len__(self):
+        return len(self.open_qty)
+
+    def __contains__(self, symbol):
+        return symbol in self.open_qty
+
+    def apply(self, symbol, side, qty, price, timestamp=None):
+        """
+        Books one fill. Returns the P&L realized by it (0 for buys).
+        """
+        qty, price = float(qty), float(price)
+        time = pd.Timestamp(timestamp).value if timestamp is not None else 0
+        if self.cash is not None:
+            self.cash += -qty * price if side == 'buy' else qty * price
+        if side == 'buy':
+            self.__buy__(symbol, qty, price, time)
+            return 0.0
+        return self.__sell__(symbol, qty, price)
+
+    def apply_fill(self, fill):
+        """
+        FillLedger listener form of apply().
+        """
+        return self.apply(fill['symbol'], fill['side'], fill['qty'], fill['price'], fill.get('timestamp'))
+
+    def __buy__(self, symbol, qty, price, time):
+        lots = self.lots.get(symbol)
+        if lots is None:
+            lots = self.lots[symbol] = Lots()
+            self.open_qty[symbol] = 0.0
+            self.open_cost[symbol] = 0.0
+            self.last_price[symbol] = price
+
+        if self.method == 'average' and len(lots):
+            held = self.open_qty[symbol] + qty
+            lots.qty[lots.head] = held
+            lots.price[lots.head] = (self.open_cost[symbol] + qty * price) / held
+            lots.time[lots.head] = time
+        else:
+            lots.append(qty, price, time)
+
+        self.open_qty[symbol] += qty
+        self.open_cost[symbol] += qty * price
+        self.total_cost += qty * price
+        self.market_value += qty * self.last_price[symbol]
+
+    def __sell__(self, symbol, qty, price):
+        lots = self.lots.get(symbol)
+        if lots is None:
+            logger.warning(f"Sell of {qty} {symbol} with no open lots")
+            return 0.0
+
+        cost = 0.0
+        sold = 0.0
+        while qty > 0 and lots.head < lots.tail:
+            taken = min(qty, lots.qty[lots.head])
+            cost += taken * lots.price[lots.head]
+            sold += taken
+            qty -= taken
+            lots.qty[lots.head] -= taken
+            if lots.qty[lots.head] <= 0:
+                lots.head += 1
+        if qty > 0:
+            logger.warning(f"Sell of {symbol} exceeds open lots by {qty}")
+
+        realized = sold * price - cost
+        self.realized[symbol] = self.realized.get(symbol, 0.0) + realized
+        self.total_realized += realized
+        self.total_cost -= cost
+        self.market_value -= sold * self.last_price[symbol]
+        self.open_qty[symbol] -= sold
+        self.open_cost[symbol] -= cost
+        if not len(lots):
+            self.total_cost -= self.open_cost.pop(symbol)  # drop rounding residue with the position
+            del self.open_qty[symbol], self.lots[symbol]
+        return realized
+
+    def mark(self, symbol, price):
+        """
+        Update the price a symbol is valued at.
+        """
+        qty = self.open_qty.get(symbol)
+        if qty:
+            self.market_value += qty * (price - self.last_price[symbol])
+        self.last_price[symbol] = price
+
+    def cost_basis(self, symbol):
+        """
+        Average cost per share of the open lots, or None when flat.
+        """
+        qty = self.open_qty.get(symbol)
+        return self.open_cost[symbol] / qty if qty else None
+
+    def position_value(self, symbol):
+        """
+        What the open lots of a symbol cost.
+        """
+        return self.open_cost.get(symbol, 0.0)
+
+    def unrealized(self, symbol=None):
+        """
+        Unrealized P&L of one symbol, or of the whole book.
+        """
+        if symbol is None:
+            return self.market_value - self.total_cost
+        qty = self.open_qty.get(symbol)
+        return qty * self.last_price[symbol] - self.open_cost[symbol] if qty else 0.0
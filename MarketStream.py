@@ -0,0 +1,237 @@
+import asyncio
+import inspect
+import logging
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("MarketStream")
+logger.setLevel(logging.INFO)
+
+
+class BarBuilder:
+    def __init__(self, bar_seconds=60):
+        """
+        Builds fixed-length OHLCV bars from a trade stream, one open bar per symbol.
+        """
+        self.bar_seconds = bar_seconds
+        self.bars = {}  # symbol -> bar being built
+
+    def bucket(self, timestamp):
+        seconds = pd.Timestamp(timestamp).timestamp()
+        return pd.Timestamp(seconds - seconds % self.bar_seconds, unit='s', tz='UTC')
+
+    def add_trade(self, symbol, price, size, timestamp):
+        """
+        Adds a trade and returns the previous bar if this trade started a new one, else None.
+        """
+        start = self.bucket(timestamp)
+        bar = self.bars.get(symbol)
+        if bar is not None and start <= bar['timestamp']:
+            bar['high'] = max(bar['high'], price)
+            bar['low'] = min(bar['low'], price)
+            bar['close'] = price
+            bar['volume'] += size
+            return None
+
+        self.bars[symbol] = {'open': price, 'high': price, 'low': price, 'close': price,
+                             'volume': size, 'timestamp': start}
+        return bar
+
+    def current(self, symbol):
+        """
+        The bar still being built for symbol, or None.
+        """
+        return self.bars.get(symbol)
+
+
+class MarketStream:
+    def __init__(self, alpaca, feed_factory, symbols, on_trade=None, on_bar=None,
+                 bar_seconds=60, stale_after=120, on_order_update=None):
+        """
+        Push-based market data for the bot.
+        feed_factory() returns a connected-on-run feed with the alpaca_trade_api Stream surface
+        (subscribe_trades, _run_forever, stop_ws); ReplayFeed is a local stand-in for tests.
+        Trades update the last-price table and the BarBuilder, and call on_trade(symbol, price).
+        Every completed bar calls on_bar(symbol, bar). If the feed is silent for stale_after
+        seconds it is torn down and reopened, and bars missed while disconnected are backfilled
+        from the REST history before live bars resume. on_order_update, if given, is subscribed to
+        the feed's trade_updates (order status) channel when the feed has one.
+        """
+        self.alpaca = alpaca
+        self.feed_factory = feed_factory
+        self.symbols = set(symbols)
+        self.on_trade = on_trade
+        self.on_bar = on_bar
+        self.on_order_update = on_order_update
+        self.builder = BarBuilder(bar_seconds)
+        self.stale_after = stale_after
+        self.last_prices = {}  # symbol -> (price, timestamp)
+        self.day_open = {}  # symbol -> (date, first trade price of that date)
+        self.last_bar_time = {}  # symbol -> timestamp of the last bar delivered
+        self.needs_backfill = set()
+        self.last_message = time.monotonic()
+        self.running = False
+        self.feed = None
+
+    def last_price(self, symbol):
+        entry = self.last_prices.get(symbol)
+        return entry[0] if entry else None
+
+    def open_price(self, symbol):
+        """
+        First traded price of the current day, or None.
+        """
+        entry = self.day_open.get(symbol)
+        return entry[1] if entry else None
+
+    def add_symbols(self, *symbols):
+        """
+        Start watching more symbols (e.g. after a buy); takes effect on the live feed immediately.
+        """
+        new = set(symbols) - self.symbols
+        self.symbols |= new
+        if new and self.feed is not None:
+            self.feed.subscribe_trades(self.__handle_trade__, *new)
+
+    async def run(self):
+        """
+        Keeps a feed connected until stop() is called.
+        """
+        self.running = True
+        while self.running:
+            self.feed = self.feed_factory()
+            self.feed.subscribe_trades(self.__handle_trade__, *self.symbols)
+            if self.on_order_update is not None and hasattr(self.feed, 'subscribe_trade_updates'):
+                self.feed.subscribe_trade_updates(self.on_order_update)
+            self.last_message = time.monotonic()
+            feed_task = asyncio.create_task(self.feed._run_forever())
+            try:
+                while self.running and not feed_task.done():
+                    await asyncio.sleep(min(1.0, self.stale_after / 4))
+                    if time.monotonic() - self.last_message > self.stale_after:
+                        logger.warning(f"No market data for {self.stale_after}s, reconnecting")
+                        break
+            finally:
+                await self.feed.stop_ws()
+                try:
+                    await asyncio.wait_for(feed_task, timeout=10)
+                except Exception as e:
+                    logger.error(f"Error closing market data feed: {e}")
+                    feed_task.cancel()
+            if self.running:
+                self.needs_backfill = set(self.last_bar_time)
+                await asyncio.sleep(1)
+
+    async def stop(self):
+        self.running = False
+        if self.feed is not None:
+            await self.feed.stop_ws()
+
+    async def __handle_trade__(self, trade):
+        self.last_message = time.monotonic()
+        symbol, price, timestamp = trade.symbol, float(trade.price), trade.timestamp
+        self.last_prices[symbol] = (price, timestamp)
+        day = pd.Timestamp(timestamp).date()
+        if self.day_open.get(symbol, (None,))[0] != day:
+            self.day_open[symbol] = (day, price)
+
+        if symbol in self.needs_backfill:
+            self.needs_backfill.discard(symbol)
+            await self.__backfill__(symbol, timestamp)
+
+        bar = self.builder.add_trade(symbol, price, float(trade.size), timestamp)
+        if bar is not None:
+            await self.__deliver_bar__(symbol, bar)
+        if self.on_trade is not None:
+            await __dispatch__(self.on_trade, symbol, price)
+
+    async def __deliver_bar__(self, symbol, bar):
+        last = self.last_bar_time.get(symbol)
+        if last is not None and bar['timestamp'] <= last:
+            return
+        self.last_bar_time[symbol] = bar['timestamp']
+        if self.on_bar is not None:
+            await __dispatch__(self.on_bar, symbol, bar)
+
+    async def __backfill__(self, symbol, until):
+        """
+        Replays bars that closed between the last delivered bar and the first trade after a reconnect.
+        """
+        bar_seconds = self.builder.bar_seconds
+        open_bar = self.builder.bars.pop(symbol, None)
+        if open_bar is not None:
+            if open_bar['timestamp'] < self.builder.bucket(until):
+                await self.__deliver_bar__(symbol, open_bar)  # closed while we were disconnected
+            else:
+                self.builder.bars[symbol] = open_bar
+
+        last = self.last_bar_time.get(symbol)
+        if last is None:
+            return
+        start = last + timedelta(seconds=bar_seconds)
+        end = self.builder.bucket(until) - timedelta(seconds=1)
+        if end < start:
+            return
+        try:
+            bars = await asyncio.to_thread(self.alpaca.fetch_intraday_bars, symbol, start, end, bar_seconds)
+        except Exception as e:
+            logger.error(f"Error backfilling {symbol} from {start} to {end}: {e}")
+            return
+        logger.info(f"Backfilled {len(bars)} bars for {symbol}")
+        for timestamp, row in bars.iterrows():
+            await self.__deliver_bar__(symbol, {
+                'open': row['open'], 'high': row['high'], 'low': row['low'], 'close': row['close'],
+                'volume': row['volume'], 'timestamp': pd.Timestamp(timestamp),
+            })
+
+
+async def __dispatch__(handler, *args):
+    result = handler(*args)
+    if inspect.isawaitable(result):
+        await result
+
+
+class ReplayFeed:
+    def __init__(self, trades, speed=0.0, drop=None):
+        """
+        Local stand-in for the live websocket feed, for tests and offline runs.
+        trades is an iterable of dicts with symbol/price/size/timestamp, replayed in order
+        through the same handler interface as alpaca_trade_api Stream. speed scales the
+        recorded gaps between trades (0 replays as fast as possible). drop is an optional
+        (first, last) range of trade indices to skip, to simulate a disconnect.
+        """
+        self.trades = list(trades)
+        self.speed = speed
+        self.drop = drop
+        self.handlers = {}
+        self.should_run = True
+        self.position = 0
+
+    def subscribe_trades(self, handler, *symbols):
+        for symbol in symbols:
+            self.handlers[symbol] = handler
+
+    async def _run_forever(self):
+        self.should_run = True
+        previous = None
+        while self.should_run and self.position < len(self.trades):
+            trade = self.trades[self.position]
+            self.position += 1
+            if self.drop and self.drop[0] <= self.position - 1 <= self.drop[1]:
+                continue
+            handler = self.handlers.get(trade['symbol'])
+            timestamp = pd.Timestamp(trade['timestamp'])
+            if self.speed and previous is not None:
+                await asyncio.sleep((timestamp - previous).total_seconds() * self.speed)
+            previous = timestamp
+            if handler is not None:
+                await handler(SimpleNamespace(symbol=trade['symbol'], price=trade['price'],
+                                              size=trade.get('size', 0), timestamp=timestamp))
+            else:
+                await asyncio.sleep(0)
+
+    async def stop_ws(self):
+        self.should_run = False
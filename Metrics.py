@@ -0,0 +1,187 @@
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("Metrics")
+logger.setLevel(logging.INFO)
+
+
+class Histogram:
+    def __init__(self, size=2048):
+        """
+        Latency samples in seconds. Keeps the last `size` samples for percentiles,
+        plus an all-time count and sum.
+        """
+        self.samples = np.zeros(size)
+        self.size = size
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.samples[self.count % self.size] = value
+        self.count += 1
+        self.total += value
+
+    def summary(self):
+        recent = self.samples[:min(self.count, self.size)]
+        if not recent.size:
+            return {'count': 0}
+        p50, p90, p99 = np.percentile(recent, [50, 90, 99])
+        return {
+            'count': self.count,
+            'mean': self.total / self.count,
+            'p50': float(p50),
+            'p90': float(p90),
+            'p99': float(p99),
+            'max': float(recent.max()),
+        }
+
+
+class Metrics:
+    def __init__(self):
+        """
+        Process-wide counters, gauges and latency histograms for the bot's hot paths.
+        """
+        self.lock = threading.Lock()
+        self.counters = defaultdict(int)
+        self.gauges = {}
+        self.histograms = defaultdict(Histogram)
+        self.server = None
+
+    def increment(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def observe(self, name, seconds):
+        with self.lock:
+            self.histograms[name].observe(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        """
+        Times the block into histogram `name`; an exception also counts toward `name.errors`.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.increment(f"{name}.errors")
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def reset(self):
+        """
+        Drop every counter, gauge and histogram (e.g. between benchmark runs).
+        """
+        with self.lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+                'histograms': {name: histogram.summary() for name, histogram in self.histograms.items()},
+            }
+
+    def prometheus(self):
+        """
+        The snapshot in Prometheus text exposition format.
+        """
+        def clean(name):
+            return 'tradingbot_' + ''.join(c if c.isalnum() else '_' for c in name)
+
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f"{clean(name)}_total {value}")
+        for name, value in sorted(snapshot['gauges'].items()):
+            lines.append(f"{clean(name)} {value}")
+        for name, summary in sorted(snapshot['histograms'].items()):
+            if not summary['count']:
+                continue
+            for quantile in ('p50', 'p90', 'p99'):
+                lines.append(f'{clean(name)}_seconds{{quantile="0.{quantile[1:]}"}} {summary[quantile]}')
+            lines.append(f"{clean(name)}_seconds_count {summary['count']}")
+            lines.append(f"{clean(name)}_seconds_sum {summary['mean'] * summary['count']}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port=9100, host="127.0.0.1"):
+        """
+        Serve /metrics (Prometheus text) and /metrics.json from a background thread.
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body, content_type = metrics.prometheus().encode(), 'text/plain; version=0.0.4'
+                elif self.path == '/metrics.json':
+                    body, content_type = json.dumps(metrics.snapshot()).encode(), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True).start()
+        logger.info(f"Serving metrics on http://{host}:{self.server.server_address[1]}/metrics")
+        return self.server
+
+
+class InstrumentedREST:
+    def __init__(self, api, metrics):
+        """
+        Wraps an alpaca_trade_api REST client: every method call is timed into `api.<method>`
+        and counted, and the rate-limit headers of every response update the
+        `ratelimit.remaining` / `ratelimit.limit` gauges.
+        """
+        self.api = api
+        self.metrics = metrics
+        session = getattr(api, '_session', None)
+        if session is not None:
+            session.hooks['response'].append(self.__record_rate_limit__)
+
+    def __record_rate_limit__(self, response, *args, **kwargs):
+        self.metrics.increment('http.responses')
+        if response.status_code == 429:
+            self.metrics.increment('http.rate_limited')
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        if remaining is not None:
+            self.metrics.set_gauge('ratelimit.remaining', int(remaining))
+            self.metrics.set_gauge('ratelimit.limit', int(response.headers.get('X-RateLimit-Limit', 0)))
+
+    def __getattr__(self, name):
+        attribute = getattr(self.api, name)
+        if not callable(attribute) or name.startswith('_'):
+            return attribute
+        metrics = self.metrics
+
+        def call(*args, **kwargs):
+            metrics.increment(f"api.{name}.calls")
+            with metrics.timer(f"api.{name}"):
+                return attribute(*args, **kwargs)
+        return call
+
+
+metrics = Metrics()
@@ -0,0 +1,148 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import pandas as pd
+from Metrics import metrics
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("OrderManager")
+logger.setLevel(logging.INFO)
+
+TERMINAL_STATUSES = {'filled', 'canceled', 'expired', 'rejected', 'replaced'}
+
+
+class OrderManager:
+    def __init__(self, alpaca, max_workers=16):
+        """
+        Submits orders and tracks them to completion without re-listing positions.
+        submit_batch() sends a cycle's orders concurrently (the RequestScheduler still orders
+        them ahead of any other traffic and within the account's quota). Order state
+        (new / partially_filled / filled / rejected ...) is kept locally and advanced either by
+        trade_updates stream events (on_trade_update) or by one bulk list_orders call (poll).
+        Each fill adjusts alpaca.positions in place, and completed fills go into the fill
+        ledger, which keeps the checkbook and Posman's lots current.
+        """
+        self.alpaca = alpaca
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="orders")
+        self.lock = threading.Lock()
+        self.orders = {}  # order id -> state dict
+        self.open_orders = set()  # ids not yet in a terminal status
+
+    def pending(self, symbol, side=None):
+        """
+        True if symbol has an open order (on `side`, if given).
+        """
+        with self.lock:
+            return any(self.orders[order_id]['symbol'] == symbol and side in (None, self.orders[order_id]['side'])
+                       for order_id in self.open_orders)
+
+    def submit(self, symbol, qty, side, order_type="market", time_in_force="gtc", signal_time=None):
+        """
+        Place one order and start tracking it. Returns its state dict.
+        """
+        order = self.alpaca.place_order(symbol, qty=qty, side=side, order_type=order_type, time_in_force=time_in_force)
+        if signal_time is not None:
+            metrics.observe("order.signal_to_order", time.perf_counter() - signal_time)
+        metrics.increment(f"order.{side}")
+        state = {
+            'id': str(order.id),
+            'symbol': symbol,
+            'side': side,
+            'qty': float(qty),
+            'status': 'new',
+            'filled_qty': 0.0,
+            'filled_avg_price': None,
+            'submitted_at': getattr(order, 'submitted_at', None),
+        }
+        with self.lock:
+            self.orders[state['id']] = state
+            self.open_orders.add(state['id'])
+        self.__apply__(order)
+        return state
+
+    def submit_batch(self, requests, signal_time=None):
+        """
+        Submit [(symbol, qty, side)] concurrently. Returns the state dicts of the orders that
+        were accepted; failures are logged.
+        """
+        futures = [(request, self.pool.submit(self.submit, *request, signal_time=signal_time)) for request in requests]
+        submitted = []
+        for (symbol, qty, side), future in futures:
+            try:
+                submitted.append(future.result())
+            except Exception as e:
+                logger.error(f"Error placing {side.upper()} order for {symbol}: {e}")
+        return submitted
+
+    def poll(self):
+        """
+        Refresh every open order with one bulk request.
+        """
+        with self.lock:
+            if not self.open_orders:
+                return 0
+            since = min((self.orders[order_id]['submitted_at'] for order_id in self.open_orders
+                         if self.orders[order_id]['submitted_at'] is not None), default=None)
+        if since is not None:
+            since = pd.Timestamp(since) - pd.Timedelta(microseconds=1)  # `after` is exclusive
+        updated = 0
+        for order in self.alpaca.fetch_recent_orders(after=since):
+            if str(order.id) in self.open_orders:
+                self.__apply__(order)
+                updated += 1
+        return updated
+
+    async def on_trade_update(self, update):
+        """
+        Handler for the trade_updates stream (alpaca_trade_api Stream.subscribe_trade_updates).
+        """
+        order = update.order
+        if isinstance(order, dict):
+            order = SimpleNamespace(**dict({'filled_qty': None, 'filled_avg_price': None, 'filled_at': None}, **order))
+        self.__apply__(order)
+
+    def __apply__(self, order):
+        """
+        Moves a tracked order to the broker's view of it and books any newly filled quantity.
+        """
+        order_id = str(order.id)
+        status = str(order.status)
+        filled_qty = float(order.filled_qty or 0)
+        price = float(order.filled_avg_price) if order.filled_avg_price else None
+        with self.lock:
+            state = self.orders.get(order_id)
+            if state is None:
+                return
+            delta = filled_qty - state['filled_qty']
+            state.update(status=status, filled_qty=filled_qty, filled_avg_price=price)
+            if status in TERMINAL_STATUSES:
+                self.open_orders.discard(order_id)
+            elif status == 'new' and filled_qty:
+                state['status'] = 'partially_filled'
+
+        if delta > 0 and price is not None:
+            self.__update_position__(state['symbol'], state['side'], delta, price)
+        if status in TERMINAL_STATUSES:
+            if status in ('rejected', 'canceled', 'expired'):
+                logger.warning(f"{state['side'].upper()} order {order_id} for {state['symbol']} ended {status}")
+            if filled_qty and price is not None:
+                filled_at = getattr(order, 'filled_at', None)
+                self.alpaca.ledger.record([{
+                    'order_id': order_id, 'symbol': state['symbol'], 'side': state['side'],
+                    'qty': filled_qty, 'price': price,
+                    'timestamp': pd.Timestamp(filled_at) if filled_at is not None else pd.Timestamp.now(tz='UTC'),
+                }])
+
+    def __update_position__(self, symbol, side, qty, price):
+        positions = self.alpaca.positions
+        position = positions.get(symbol)
+        if position is None:
+            if side != 'buy':
+                return
+            position = positions[symbol] = {'qty': 0, 'current_price': price, 'market_price': price}
+        position['qty'] += qty if side == 'buy' else -qty
+        if position['qty'] <= 0:
+            del positions[symbol]
+
@@ -0,0 +1,203 @@
+import hashlib
+import itertools
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import numpy as np
+from Backtester import Backtester
+from indicators import IndicatorEngine
+from strategies import *
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("ParameterSweep")
+logger.setLevel(logging.INFO)
+
+FIELDS = ('open', 'high', 'low', 'close')
+
+# Strategy order for the 'weights' parameter. A sixth weight, if given, is the position
+# sizing vote, which depends on the live account and is held neutral (0) in a sweep.
+SWEEP_STRATEGIES = [moving_average_crossover, volatility_calculator, macd_strategy, mean_reversion_strategy, rsi_strategy]
+
+DEFAULT_GRID = {
+    'weights': [(1.5, 1.0, 1.2, 1.2, 1.1, 1.4)],
+    'overbought': [70],
+    'oversold': [30],
+    'bollinger_window': [20],
+    'buy_threshold': [0.25],
+    'sell_threshold': [-0.45],
+}
+
+
+def __neutral_sizing__(symbol, data):
+    return 0
+
+
+def expand_grid(grid):
+    """
+    Cartesian product of a {parameter: [values]} grid, as a list of parameter dicts.
+    """
+    grid = dict(DEFAULT_GRID, **grid)
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def combo_id(combo):
+    return hashlib.sha1(json.dumps(combo, sort_keys=True).encode()).hexdigest()[:16]
+
+
+# Worker-process state, set once by __attach__ so each task only receives a parameter dict.
+__worker__ = {}
+
+
+def __attach__(shm_name, shape, symbols, lengths):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    panel = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    __worker__['shm'] = shm  # keep the mapping alive for the life of the worker
+    __worker__['engines'] = {
+        symbol: IndicatorEngine({field: panel[f, i, :lengths[i]] for f, field in enumerate(FIELDS)})
+        for i, symbol in enumerate(symbols)
+    }
+
+
+def evaluate(combo):
+    """
+    Backtest every symbol in the shared panel under one parameter combination and
+    aggregate the results. Indicator engines persist in the worker, so an indicator
+    computed for one combination is reused by every later one that needs it.
+    """
+    weights = combo['weights']
+    strategies = list(zip(SWEEP_STRATEGIES, weights))
+    if len(weights) > len(SWEEP_STRATEGIES):
+        strategies.append((__neutral_sizing__, weights[len(SWEEP_STRATEGIES)]))
+    backtester = Backtester(strategies, buy_threshold=combo['buy_threshold'], sell_threshold=combo['sell_threshold'])
+    params = {
+        'rsi_strategy': {'overbought': combo['overbought'], 'oversold': combo['oversold']},
+        'mean_reversion_strategy': {'window': combo['bollinger_window']},
+    }
+
+    returns, sharpes, drawdowns, trades = [], [], [], 0
+    for symbol, engine in __worker__['engines'].items():
+        if len(engine) == 0:
+            continue
+        score = backtester.score(engine, symbol, engine, params)
+        result = backtester.simulate(engine.column('open'), engine.column('close'), score)
+        returns.append(result['total_return'])
+        sharpes.append(result['sharpe'])
+        drawdowns.append(result['max_drawdown'])
+        trades += len(result['trades'])
+
+    return {
+        'id': combo_id(combo),
+        'params': combo,
+        'mean_return': float(np.mean(returns)) if returns else 0.0,
+        'mean_sharpe': float(np.mean(sharpes)) if sharpes else 0.0,
+        'worst_drawdown': float(np.min(drawdowns)) if drawdowns else 0.0,
+        'trades': trades,
+    }
+
+
+class ParameterSweep:
+    def __init__(self, bars, results_path="sweep_results.jsonl", max_workers=None):
+        """
+        Grid search over strategy weights and thresholds.
+        bars maps symbol -> DataFrame of cached bars, or a mapping of bar arrays such as
+        ColumnStore.slices() returns, which is read from disk one symbol at a time while
+        packing, never held whole as DataFrames. They are packed once into a shared
+        memory panel (fields x symbols x bars) that worker processes map directly, and
+        every finished combination is appended to results_path, so an interrupted sweep
+        picks up where it left off.
+        """
+        self.symbols = list(bars)
+        self.lengths = [len(bars[symbol]['close']) for symbol in self.symbols]
+        self.shape = (len(FIELDS), len(self.symbols), max(self.lengths, default=0))
+        self.bars = bars
+        self.results_path = results_path
+        self.max_workers = max_workers or os.cpu_count()
+
+    def completed(self):
+        """
+        Ids of combinations already written to results_path.
+        """
+        done = set()
+        if os.path.exists(self.results_path):
+            with open(self.results_path) as results:
+                for line in results:
+                    try:
+                        done.add(json.loads(line)['id'])
+                    except (ValueError, KeyError):
+                        continue  # partial line from an interrupted write
+        return done
+
+    def run(self, grid):
+        """
+        Evaluate every combination of grid not already in results_path.
+        Returns all results (old and new) sorted by mean Sharpe, best first.
+        """
+        combos = expand_grid(grid)
+        done = self.completed()
+        pending = [combo for combo in combos if combo_id(combo) not in done]
+        logger.info(f"Sweeping {len(pending)} of {len(combos)} combinations over {len(self.symbols)} symbols")
+
+        if pending:
+            shm = shared_memory.SharedMemory(create=True, size=max(int(np.prod(self.shape)) * 8, 1))
+            try:
+                panel = np.ndarray(self.shape, dtype=np.float64, buffer=shm.buf)
+                panel.fill(np.nan)
+                for i, symbol in enumerate(self.symbols):
+                    for f, field in enumerate(FIELDS):
+                        panel[f, i, :self.lengths[i]] = np.asarray(self.bars[symbol][field], dtype=float)
+
+                with ProcessPoolExecutor(max_workers=self.max_workers, initializer=__attach__,
+                                         initargs=(shm.name, self.shape, self.symbols, self.lengths)) as pool, \
+                        open(self.results_path, 'a') as results:
+                    futures = [pool.submit(evaluate, combo) for combo in pending]
+                    for count, future in enumerate(as_completed(futures), 1):
+                        results.write(json.dumps(future.result()) + "\n")
+                        results.flush()
+                        if count % 100 == 0:
+                            logger.info(f"{count}/{len(pending)} combinations done")
+            finally:
+                shm.close()
+                shm.unlink()
+
+        return self.results()
+
+    def results(self):
+        """
+        Every result in results_path, sorted by mean Sharpe, best first.
+        """
+        loaded = []
+        if os.path.exists(self.results_path):
+            with open(self.results_path) as results:
+                for line in results:
+                    try:
+                        loaded.append(json.loads(line))
+                    except ValueError:
+                        continue
+        return sorted(loaded, key=lambda result: result['mean_sharpe'], reverse=True)
+
+
+# Example usage
+if __name__ == "__main__":
+    from config import ALPACA_API_KEY, ALPACA_SECRET_KEY
+    from AlpacaAPI import AlpacaAPI
+    from ColumnStore import ColumnStore
+
+    alpaca = AlpacaAPI(ALPACA_API_KEY, ALPACA_SECRET_KEY)
+    store = ColumnStore("bar_store")
+    symbols = list(alpaca.fetch_positions())
+    for symbol in symbols:  # only bars newer than what the store holds are appended
+        store.append(symbol, alpaca.fetch_historical_data(symbol, "2020-01-01"))
+
+    sweep = ParameterSweep(store.slices(symbols, "2020-01-01"))
+    best = sweep.run({
+        'overbought': [65, 70, 75, 80],
+        'oversold': [20, 25, 30, 35],
+        'bollinger_window': [10, 20, 30],
+        'buy_threshold': [0.15, 0.25, 0.35],
+        'sell_threshold': [-0.25, -0.45, -0.65],
+    })
+    for result in best[:10]:
+        print(result)
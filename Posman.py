@@ -1,12 +1,29 @@
 import logging
+from LotBook import LotBook
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("Posman")
 logger.setLevel(logging.INFO)
 
 class Posman:
-    def __init__(self, bot) -> None:
+    def __init__(self, bot, method='fifo') -> None:
+        """
+        Keeps a LotBook (FIFO or average cost) in step with the account's fills: it replays the
+        fill ledger once, then books each new fill as the ledger records it.
+        """
         self.bot = bot
+        self.lots = LotBook(method)
+        ledger = getattr(getattr(bot, 'alpaca', None), 'ledger', None)
+        if ledger is not None:
+            for fill in ledger.transactions():
+                self.lots.apply_fill(fill)
+            ledger.listeners.append(self.lots.apply_fill)
+
+    def mark(self, symbol, price):
+        """
+        Revalue a held symbol at a new market price.
+        """
+        self.lots.mark(symbol, price)
 
     def calculate_position_value(self, symbol):
         """
@@ -17,14 +34,19 @@ class Posman:
             if symbol not in self.bot.alpaca.positions:
                 raise ValueError(f"Symbol {symbol} not found in positions.")
             
-            if symbol not in self.bot.alpaca.checkbook:
-                raise ValueError(f"Buy price for {symbol} not found in checkbook.")
-            
             # Get the quantity of stocks held for the symbol
             qty = self.bot.alpaca.positions[symbol]['qty']
             if not qty or qty <= 0:
                 raise ValueError(f"Invalid quantity {qty} for symbol {symbol}.")
-            
+
+            # Cost basis of the open lots when the fills are known
+            cost_basis = self.lots.cost_basis(symbol)
+            if cost_basis is not None:
+                return cost_basis * qty
+
+            if symbol not in self.bot.alpaca.checkbook:
+                raise ValueError(f"Buy price for {symbol} not found in checkbook.")
+
             # Get the average buy price from the checkbook
             buy_prices = self.bot.alpaca.checkbook[symbol]
             if not isinstance(buy_prices, list) or not buy_prices:
@@ -43,16 +65,14 @@ class Posman:
     
     def available_funds(self):
         """
-        returns uninvested funds
+        returns uninvested funds: portfolio value less what the open positions cost,
+        from running totals once cash is known
         """
         try:
-            total_portfolio_value = self.bot.alpaca.calculate_portfolio_value()
-            total_positions_value = 0
-            positions = self.bot.alpaca.fetch_positions()
-
-            for symbol in positions:
-                total_positions_value += self.calculate_position_value(symbol=symbol)
-            available_funds = float(total_portfolio_value) - total_positions_value
+            if self.lots.cash is None:
+                self.lots.cash = float(self.bot.alpaca.get_account_info().cash)
+            total_portfolio_value = self.lots.cash + self.lots.market_value
+            available_funds = total_portfolio_value - self.lots.total_cost
             return available_funds
         except Exception as e:
             print("Error calculating funds...")
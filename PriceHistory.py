@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+
+FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+
+class PriceHistory:
+    __slots__ = ('symbol', 'capacity', 'values', 'timestamps', 'head', 'count')
+
+    columns = FIELDS
+
+    def __init__(self, symbol, capacity=2048):
+        """
+        Last `capacity` OHLCV bars of one symbol in preallocated NumPy buffers.
+        Every bar is written twice, at slot and slot + capacity, so the live window is always
+        one contiguous slice: history['close'] is a view, never a copy, and append() writes
+        into the existing buffers without allocating. Reads as a mapping of field -> array
+        (with .index holding int64 ns timestamps), which IndicatorEngine and the strategies
+        accept like a DataFrame.
+        """
+        self.symbol = symbol
+        self.capacity = capacity
+        self.values = np.full((len(FIELDS), 2 * capacity), np.nan)
+        self.timestamps = np.zeros(2 * capacity, dtype='int64')
+        self.head = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def empty(self):
+        return self.count == 0
+
+    @property
+    def index(self):
+        return self.timestamps[self.head:self.head + self.count]
+
+    def __contains__(self, field):
+        return field in FIELDS
+
+    def __getitem__(self, field):
+        return self.values[FIELDS.index(field), self.head:self.head + self.count]
+
+    def last_timestamp(self):
+        """
+        Timestamp of the newest bar (int64 ns), or None.
+        """
+        return int(self.timestamps[self.head + self.count - 1]) if self.count else None
+
+    def append(self, timestamp, open_, high, low, close, volume=0.0):
+        """
+        Adds one bar (timestamp as int64 ns), dropping the oldest once full.
+        """
+        if self.count < self.capacity:
+            slot = self.count
+            self.count += 1
+        else:
+            slot = self.head
+            self.head = (self.head + 1) % self.capacity
+        values = self.values
+        for row, value in enumerate((open_, high, low, close, volume)):
+            values[row, slot] = value
+            values[row, slot + self.capacity] = value
+        self.timestamps[slot] = timestamp
+        self.timestamps[slot + self.capacity] = timestamp
+
+    def update(self, bar):
+        """
+        Appends a bar dict (as from fetch_raw_data) if it is newer than the last one.
+        Returns False otherwise.
+        """
+        timestamp = pd.Timestamp(bar['timestamp'])
+        timestamp = (timestamp.tz_convert('UTC') if timestamp.tzinfo else timestamp.tz_localize('UTC')).as_unit('ns').value
+        if self.count and timestamp <= self.last_timestamp():
+            return False
+        self.append(timestamp, bar['open'], bar['high'], bar['low'], bar['close'], bar.get('volume', 0.0))
+        return True
+
+    def extend(self, bars):
+        """
+        Appends the rows of a bars DataFrame newer than the last stored bar. Returns how many.
+        """
+        if bars is None or bars.empty:
+            return 0
+        index = pd.DatetimeIndex(bars.index)
+        timestamps = (index.tz_convert('UTC') if index.tz else index.tz_localize('UTC')).as_unit('ns').asi8
+        last = self.last_timestamp()
+        rows = np.flatnonzero(timestamps > last) if last is not None else np.arange(len(timestamps))
+        columns = [bars[field].to_numpy(dtype=float) if field in bars else np.zeros(len(bars)) for field in FIELDS]
+        for row in rows:
+            self.append(timestamps[row], *(column[row] for column in columns))
+        return len(rows)
+
+    def agrees_with(self, bars):
+        """
+        False if a bars DataFrame holds the newest stored bar with different OHLC values
+        (e.g. history re-adjusted for a split or dividend since it was stored).
+        """
+        last = self.last_timestamp()
+        if last is None or bars is None or bars.empty:
+            return True
+        index = pd.DatetimeIndex(bars.index)
+        timestamps = (index.tz_convert('UTC') if index.tz else index.tz_localize('UTC')).as_unit('ns').asi8
+        rows = np.flatnonzero(timestamps == last)
+        if not len(rows):
+            return True
+        stored = self.values[:4, self.head + self.count - 1]
+        fetched = bars.iloc[rows[-1]][['open', 'high', 'low', 'close']].to_numpy(dtype=float)
+        return bool(np.allclose(stored, fetched, rtol=1e-9, atol=0.0))
+
+    def frame(self):
+        """
+        The window copied into a DataFrame shaped like fetch_historical_data output.
+        """
+        index = pd.DatetimeIndex(pd.to_datetime(self.index, utc=True), name='timestamp')
+        return pd.DataFrame({field: self[field].copy() for field in FIELDS}, index=index)
@@ -0,0 +1,293 @@
+import io
+import logging
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+from collections import defaultdict, deque
+from FillLedger import FillLedger
+from Metrics import metrics
+
+try:
+    from alpaca_trade_api.entity import Entity
+except ImportError:  # recording a SimBroker session does not need the client
+    Entity = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("Recorder")
+logger.setLevel(logging.INFO)
+
+MAGIC = b"TBREC1\n"
+FRAME = struct.Struct('<dIB')  # wall time, payload length, flags
+COMPRESSED = 1
+COMPRESS_OVER = 512  # payloads larger than this many bytes are zlib-compressed
+
+
+class __Pickler__(pickle.Pickler):
+    """
+    Pickles alpaca_trade_api entities by their state; their __getattr__ recurses under the
+    default protocol.
+    """
+    def reducer_override(self, obj):
+        if Entity is not None and isinstance(obj, Entity):
+            return __entity__, (type(obj), obj.__dict__)
+        return NotImplemented
+
+
+def __entity__(cls, state):
+    entity = cls.__new__(cls)
+    entity.__dict__.update(state)
+    return entity
+
+
+def __dumps__(value):
+    buffer = io.BytesIO()
+    __Pickler__(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(value)
+    return buffer.getvalue()
+
+
+def __key__(args, kwargs):
+    return repr((args, sorted(kwargs.items())))
+
+
+def read_log(path):
+    """
+    Yields (timestamp, record) for every frame of a session log, oldest first.
+    A frame cut short by a crash ends the log.
+    """
+    with open(path, 'rb') as handle:
+        if handle.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a session log")
+        while True:
+            header = handle.read(FRAME.size)
+            if len(header) < FRAME.size:
+                return
+            timestamp, length, flags = FRAME.unpack(header)
+            payload = handle.read(length)
+            if len(payload) < length:
+                return
+            if flags & COMPRESSED:
+                payload = zlib.decompress(payload)
+            yield timestamp, pickle.loads(payload)
+
+
+class Recorder:
+    def __init__(self, broker, path="session.rec"):
+        """
+        Wraps an AlpacaAPI (or SimBroker) and appends every response the bot consumes to a
+        timestamped binary log at path. Each frame is a FRAME header followed by a pickled
+        record, zlib-compressed when large:
+            ('ledger', fills)                          ledger contents when recording started
+            ('call', name, key, result, fills)         a broker method, its pickled result and
+                                                       the fills it booked into the ledger
+            ('error', name, key, message)              a broker method that raised
+            ('cycle', n) / ('decisions', signals)      written by TradingBot (bot.recorder)
+        Attributes other than public methods (positions, checkbook, ledger...) pass through.
+        """
+        self.broker = broker
+        self.path = path
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.cycles = 0
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.handle = open(path, 'ab')
+        if new:
+            self.handle.write(MAGIC)
+        ledger = getattr(broker, 'ledger', None)
+        if ledger is not None:
+            self.__write__(('ledger', ledger.fills()))
+            ledger.listeners.append(self.__on_fill__)
+
+    def __getattr__(self, name):
+        if name == 'broker':
+            raise AttributeError(name)
+        attribute = getattr(self.broker, name)
+        if not callable(attribute) or name.startswith('_'):
+            return attribute
+
+        def call(*args, **kwargs):
+            key = __key__(args, kwargs)
+            self.local.fills = []
+            try:
+                result = attribute(*args, **kwargs)
+            except Exception as e:
+                self.__write__(('error', name, key, str(e)))
+                raise
+            finally:
+                fills, self.local.fills = self.local.fills, None
+            self.__write__(('call', name, key, __dumps__(result), fills))
+            return result
+        return call
+
+    def __on_fill__(self, fill):
+        fills = getattr(self.local, 'fills', None)
+        if fills is not None:  # fills booked outside a broker call are replayed by the bot itself
+            fills.append(dict(fill))
+
+    def __write__(self, record):
+        payload = __dumps__(record)
+        flags = 0
+        if len(payload) > COMPRESS_OVER:
+            payload, flags = zlib.compress(payload, 1), COMPRESSED
+        with self.lock:
+            self.handle.write(FRAME.pack(time.time(), len(payload), flags))
+            self.handle.write(payload)
+
+    def begin_cycle(self):
+        self.__write__(('cycle', self.cycles))
+        self.cycles += 1
+        self.handle.flush()
+
+    def decisions(self, signals):
+        self.__write__(('decisions', list(signals)))
+
+    def close(self):
+        with self.lock:
+            self.handle.close()
+
+
+class ReplayBroker:
+    def __init__(self, path):
+        """
+        Stands in for the broker of a recorded session. Each call is answered with the next
+        response recorded for the same method and arguments within the current cycle (so
+        threads may ask in any order); once those run out the last response is repeated.
+        Fills the call booked are applied to this broker's own ledger, and every cycle's
+        decisions are kept next to the recorded ones for comparison.
+        """
+        self.path = path
+        self.ledger = FillLedger(":memory:")
+        self.checkbook = self.ledger.checkbook
+        self.sold_book = self.ledger.sold_book
+        self.positions = {}
+        self.snapshot = None
+        self.setup = {'calls': defaultdict(deque), 'decisions': []}
+        self.cycles = []
+        self.started = self.ended = None
+
+        segment = self.setup
+        for timestamp, record in read_log(path):
+            self.started = timestamp if self.started is None else self.started
+            self.ended = timestamp
+            kind = record[0]
+            if kind == 'ledger':
+                self.ledger.record(record[1])
+            elif kind == 'cycle':
+                segment = {'calls': defaultdict(deque), 'decisions': [], 'started': timestamp}
+                self.cycles.append(segment)
+            elif kind == 'decisions':
+                segment['decisions'].append(record[1])
+            else:
+                segment['calls'][(record[1], record[2])].append(record)
+
+        self.segment = self.setup
+        self.cycle = -1
+        self.last = {}  # (name, key) -> last record served
+        self.replayed = []  # decisions made during replay, per cycle
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self.__serve__(name, args, kwargs)
+
+    def __serve__(self, name, args, kwargs):
+        started = time.perf_counter()
+        call = (name, __key__(args, kwargs))
+        queue = self.segment['calls'].get(call)
+        if queue:
+            record = self.last[call] = queue.popleft()
+            if record[0] == 'call' and record[4]:
+                self.ledger.record(record[4])
+        elif call in self.last:
+            record = self.last[call]
+        else:
+            raise Exception(f"{name}{call[1]} was not recorded")
+        metrics.observe("replay.broker", time.perf_counter() - started)
+        if record[0] == 'error':
+            raise Exception(record[3])
+        result = pickle.loads(record[3])
+        if name == 'fetch_positions':
+            self.positions = result
+        return result
+
+    def begin_cycle(self):
+        self.cycle += 1
+        self.segment = self.cycles[self.cycle] if self.cycle < len(self.cycles) else {'calls': {}, 'decisions': []}
+        self.replayed.append([])
+
+    def decisions(self, signals):
+        self.replayed[self.cycle].append(list(signals))
+
+
+async def replay(path, build=None):
+    """
+    Runs a recorded session's cycles back through TradingBot.monitor_cycle as fast as they
+    go. build(broker) returns the bot (default TradingBot.build_bot, as the live session is
+    wired). Returns per-cycle decision mismatches and the stage timings from Metrics.
+    Replay stops at the first cycle that needs a response the session never recorded.
+    """
+    from TradingBot import build_bot
+
+    broker = ReplayBroker(path)
+    bot = (build or build_bot)(broker)
+    bot.recorder = broker
+    metrics.reset()
+    mismatches = []
+    started = time.perf_counter()
+    for cycle, segment in enumerate(broker.cycles):
+        try:
+            await bot.monitor_cycle()
+        except Exception as e:  # the bot asked for something the session never did: it has diverged
+            mismatches.append({'cycle': cycle, 'recorded': segment['decisions'], 'error': str(e)})
+            break
+        if broker.replayed[cycle] != segment['decisions']:
+            mismatches.append({'cycle': cycle, 'recorded': segment['decisions'], 'replayed': broker.replayed[cycle]})
+    elapsed = time.perf_counter() - started
+
+    recorded = broker.ended - broker.cycles[0]['started'] if broker.cycles else 0.0
+    stages = metrics.snapshot()['histograms']
+    report = {
+        'cycles': len(broker.cycles),
+        'identical': not mismatches,
+        'mismatches': mismatches,
+        'recorded_seconds': recorded,
+        'replay_seconds': elapsed,
+        'speedup': recorded / elapsed if elapsed else 0.0,
+        'stages': {name: summary for name, summary in stages.items()
+                   if name.split('.')[0] in ('cycle', 'strategy', 'order', 'lock', 'replay')},
+    }
+    logger.info(f"Replayed {report['cycles']} cycles in {elapsed:.2f}s "
+                f"({'identical' if report['identical'] else f'{len(mismatches)} cycles differ'})")
+    return report
+
+
+# Example usage
+if __name__ == "__main__":
+    import asyncio
+    import json
+    import sys
+    from SimBroker import SimBroker, synthetic_bars
+    from TradingBot import build_bot
+
+    if len(sys.argv) > 1:
+        print(json.dumps(asyncio.run(replay(sys.argv[1])), indent=2, default=str))
+        sys.exit(0)
+
+    symbols = [f"SYM{i:03d}" for i in range(50)]
+    broker = SimBroker(synthetic_bars(symbols, length=300), cash=1_000_000, holdings={symbol: 5 for symbol in symbols})
+    if os.path.exists("session.rec"):
+        os.remove("session.rec")
+    recorder = Recorder(broker, "session.rec")
+    bot = build_bot(recorder)
+    bot.recorder = recorder
+
+    async def record(cycles=20):
+        for _ in range(cycles):
+            await bot.monitor_cycle()
+            broker.advance()
+
+    asyncio.run(record())
+    recorder.close()
+    print(json.dumps(asyncio.run(replay("session.rec")), indent=2, default=str))
@@ -0,0 +1,214 @@
+import itertools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from requests.adapters import HTTPAdapter
+from Metrics import metrics
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("RequestScheduler")
+logger.setLevel(logging.INFO)
+
+# Lower runs first. Exits must never wait behind a history refresh.
+PRIORITY_ORDER = 0
+PRIORITY_STOP = 1
+PRIORITY_ACCOUNT = 2
+PRIORITY_HISTORY = 5
+
+METHOD_PRIORITIES = {
+    'submit_order': PRIORITY_ORDER,
+    'cancel_order': PRIORITY_ORDER,
+    'replace_order': PRIORITY_ORDER,
+    'get_order': PRIORITY_ORDER,
+    'list_positions': PRIORITY_STOP,
+    'get_latest_trade': PRIORITY_STOP,
+    'get_latest_trades': PRIORITY_STOP,
+    'get_latest_bar': PRIORITY_STOP,
+    'get_latest_bars': PRIORITY_STOP,
+    'get_clock': PRIORITY_ACCOUNT,
+    'get_account': PRIORITY_ACCOUNT,
+    'list_orders': PRIORITY_ACCOUNT,
+    'get_bars': PRIORITY_HISTORY,
+    'list_assets': PRIORITY_HISTORY,
+}
+
+# Methods with side effects are never coalesced.
+MUTATING_METHODS = {'submit_order', 'cancel_order', 'replace_order', 'cancel_all_orders', 'close_position', 'close_all_positions'}
+
+
+class TokenBucket:
+    def __init__(self, per_minute, burst=None):
+        """
+        Allows per_minute requests per minute on average, up to `burst` back to back.
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst or max(per_minute // 10, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def __refill__(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """
+        Blocks until a token is available and takes it. Returns the seconds waited.
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                self.__refill__()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def drain(self):
+        """
+        Empties the bucket, e.g. after the server answered 429.
+        """
+        with self.lock:
+            self.__refill__()
+            self.tokens = min(self.tokens, 0.0)
+
+    def available(self):
+        with self.lock:
+            self.__refill__()
+            return self.tokens
+
+
+class RequestScheduler:
+    def __init__(self, requests_per_minute=200, workers=4, burst=None):
+        """
+        Single gateway for REST traffic: a priority queue served by `workers` threads,
+        a token bucket sized to the account's per-minute quota, and coalescing of
+        identical read requests that are already queued or in flight.
+        """
+        self.bucket = TokenBucket(requests_per_minute, burst)
+        self.queue = queue.PriorityQueue()
+        self.sequence = itertools.count()
+        self.in_flight = {}  # coalescing key -> Future
+        self.lock = threading.Lock()
+        self.workers = workers
+        for number in range(workers):
+            threading.Thread(target=self.__work__, name=f"rest-{number}", daemon=True).start()
+
+    def submit(self, priority, key, func, *args, **kwargs):
+        """
+        Queue func(*args, **kwargs) and return a Future. If key is not None and a request with
+        the same key is still pending, its Future is returned instead of queuing a duplicate.
+        """
+        with self.lock:
+            if key is not None and key in self.in_flight:
+                metrics.increment("scheduler.coalesced")
+                return self.in_flight[key]
+            future = Future()
+            if key is not None:
+                self.in_flight[key] = future
+        self.queue.put((priority, next(self.sequence), time.perf_counter(), key, future, func, args, kwargs))
+        metrics.set_gauge("scheduler.queue_depth", self.queue.qsize())
+        return future
+
+    def call(self, priority, key, func, *args, **kwargs):
+        """
+        submit() and wait for the result.
+        """
+        return self.submit(priority, key, func, *args, **kwargs).result()
+
+    def rate_limited(self):
+        """
+        Called when the server returns 429: stop spending tokens until the bucket refills.
+        """
+        logger.warning("Rate limited by the server, backing off")
+        self.bucket.drain()
+
+    def __work__(self):
+        while True:
+            request = self.queue.get()
+            throttled = self.bucket.acquire()
+            request = self.__most_urgent__(request)
+            priority, _, queued, key, future, func, args, kwargs = request
+            try:
+                metrics.observe("scheduler.wait", time.perf_counter() - queued)
+                if throttled:
+                    metrics.observe("scheduler.throttled", throttled)
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(func(*args, **kwargs))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                if key is not None:
+                    with self.lock:
+                        self.in_flight.pop(key, None)
+                metrics.set_gauge("scheduler.tokens", round(self.bucket.available(), 2))
+
+    def __most_urgent__(self, request):
+        """
+        After waiting for a token, swap the request taken for a more urgent one queued since,
+        so an order never runs behind a bar download that was already holding a worker.
+        """
+        try:
+            waiting = self.queue.get_nowait()
+        except queue.Empty:
+            return request
+        if waiting[:2] < request[:2]:
+            self.queue.put(request)
+            return waiting
+        self.queue.put(waiting)
+        return request
+
+
+class ScheduledREST:
+    def __init__(self, api, scheduler, pool_size=None):
+        """
+        Routes every public method of an alpaca_trade_api REST client through a RequestScheduler.
+        The client's requests.Session is remounted with a keep-alive pool large enough for all
+        scheduler workers, and 429 responses tell the scheduler to back off.
+        """
+        self.api = api
+        self.scheduler = scheduler
+        session = getattr(api, '_session', None)
+        if session is not None:
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size or scheduler.workers * 2)
+            session.mount('https://', adapter)
+            session.hooks['response'].append(self.__check_rate_limit__)
+
+    def __check_rate_limit__(self, response, *args, **kwargs):
+        if response.status_code == 429:
+            self.scheduler.rate_limited()
+
+    def __getattr__(self, name):
+        attribute = getattr(self.api, name)
+        if not callable(attribute) or name.startswith('_'):
+            return attribute
+        priority = METHOD_PRIORITIES.get(name, PRIORITY_ACCOUNT)
+        scheduler = self.scheduler
+
+        def call(*args, **kwargs):
+            key = None
+            if name not in MUTATING_METHODS:
+                key = (name, __freeze__(args), __freeze__(sorted(kwargs.items())))
+            return scheduler.call(priority, key, attribute, *args, **kwargs)
+        return call
+
+
+def __freeze__(value):
+    """
+    Hashable form of call arguments (lists become tuples).
+    """
+    if isinstance(value, (list, tuple)):
+        return tuple(__freeze__(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, __freeze__(v)) for k, v in value.items()))
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return repr(value)
@@ -0,0 +1,199 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import queue
+import time
+import zlib
+from Metrics import metrics
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("ShardedRuntime")
+logger.setLevel(logging.INFO)
+
+
+def shard_of(symbol, shards):
+    """
+    Stable symbol -> shard assignment, so a symbol's history and indicator state stay in one worker.
+    """
+    return zlib.crc32(symbol.encode()) % shards
+
+
+def strategy_name(strategy):
+    return f"{getattr(strategy, '__module__', '')}.{getattr(strategy, '__qualname__', repr(strategy))}"
+
+
+def shard_broker(shard, api_key, secret_key, requests_per_minute=200, **kwargs):
+    """
+    broker_factory for live shards. Workers only score, so each gets no fill ledger (the
+    coordinator alone syncs fills) and a bar cache file of its own, which also holds only the
+    symbols of its shard; N+1 processes never write one SQLite file.
+    """
+    from AlpacaAPI import AlpacaAPI
+    return AlpacaAPI(api_key, secret_key, cache_path=f"bar_cache.shard{shard}.db",
+                     requests_per_minute=requests_per_minute, ledger_path=None, **kwargs)
+
+
+def __worker_main__(shard, broker_factory, strategies_factory, commands, results):
+    """
+    Worker process: owns a broker connection and a TradingBot used only for scoring.
+    Receives (cycle, [symbol]) and answers one (cycle, shard, symbol, score, error) per
+    symbol. It never places orders or checks stops; those live in the coordinator alone.
+    """
+    from BacktestManager import BacktestManager
+    from Posman import Posman
+    from TradingBot import TradingBot
+
+    logging.getLogger().setLevel(logging.WARNING)  # the coordinator does the per-decision logging
+    bot = TradingBot(broker_factory(shard))
+    bot.__setPosman__(Posman(bot))
+    bot.__setBacktestManager__(BacktestManager(strategies_factory(), bot))
+    while True:
+        command = commands.get()
+        if command is None:
+            break
+        cycle, work = command
+        for symbol in work:
+            try:
+                results.put((cycle, shard, symbol, bot.backtest_strategy(symbol), None))
+            except Exception as e:
+                results.put((cycle, shard, symbol, None, str(e)))
+
+
+class ShardedRuntime:
+    def __init__(self, bot, broker_factory, strategies_factory, shards=None, context="spawn"):
+        """
+        Spreads data refresh and scoring for the bot's book over worker processes.
+        broker_factory(shard) builds each worker's AlpacaAPI (or SimBroker); give each a share
+        of the account's request quota and keep it off the coordinator's SQLite files, e.g.
+        partial(shard_broker, api_key=key, secret_key=secret, requests_per_minute=200 // shards).
+        strategies_factory() returns the (strategy, weight) list the workers score with; both
+        must be picklable (module-level functions or functools.partial).
+        Workers send their decisions back to this process, which alone owns positions and calls
+        execute_batch, so two shards can never race on an order.
+        Strategies in bot.btm that the workers do not run (e.g. the position sizing lambda,
+        which reads the account) are evaluated here and folded into the shard's score.
+        """
+        self.bot = bot
+        self.broker_factory = broker_factory
+        self.strategies_factory = strategies_factory
+        self.shards = shards or multiprocessing.cpu_count()
+        self.context = multiprocessing.get_context(context)
+        self.cycles = itertools.count()
+        self.workers = []
+        self.commands = []
+        self.results = None
+
+        shard_strategies = strategies_factory()
+        self.shard_weight = sum(weight for _, weight in shard_strategies)
+        shard_names = {strategy_name(strategy) for strategy, _ in shard_strategies}
+        self.local_strategies = [(strategy, weight) for strategy, weight in (bot.btm.strategies if bot.btm else [])
+                                 if strategy_name(strategy) not in shard_names]
+
+    def start(self):
+        self.results = self.context.Queue()
+        for shard in range(self.shards):
+            commands = self.context.Queue()
+            worker = self.context.Process(
+                target=__worker_main__, name=f"shard-{shard}", daemon=True,
+                args=(shard, self.broker_factory, self.strategies_factory, commands, self.results),
+            )
+            worker.start()
+            self.commands.append(commands)
+            self.workers.append(worker)
+        logger.info(f"Started {self.shards} shard workers")
+
+    def stop(self):
+        for commands in self.commands:
+            commands.put(None)
+        for worker in self.workers:
+            worker.join(timeout=10)
+            if worker.is_alive():
+                worker.terminate()
+        self.workers, self.commands = [], []
+
+    def combine(self, symbol, score):
+        """
+        Folds the coordinator-side strategies into a shard's weighted score.
+        """
+        if not self.local_strategies:
+            return score
+        total_score = score * self.shard_weight
+        total_weight = self.shard_weight
+        for strategy, weight in self.local_strategies:
+            total_score += strategy(symbol, None) * weight
+            total_weight += weight
+        return total_score / total_weight if total_weight > 0 else 0
+
+    async def monitor_cycle(self, timeout=300):
+        """
+        One pass over the book: positions are read and stops checked here, the rest are scored
+        in the shards, and the resulting orders are placed here as one batch.
+        """
+        bot = self.bot
+        started = time.perf_counter()
+        if bot.recorder is not None:
+            bot.recorder.begin_cycle()
+        await asyncio.to_thread(bot.orders.poll)
+        positions = await asyncio.to_thread(bot.alpaca.fetch_positions)
+        bot.stops.retain(positions)
+        work = [[] for _ in range(self.shards)]
+        signals = []
+        for symbol, position in positions.items():
+            if symbol not in bot.alpaca.checkbook:
+                logger.warning(f"{symbol} not found in checkbook during monitoring.\n")
+                continue
+            price = float(position['market_price'])
+            bot.posman.mark(symbol, price)
+            reason = bot.stops.update(symbol, price, bot.alpaca.checkbook[symbol][-1])
+            if reason is not None:  # sold here, not worth a round trip to a shard
+                signals.append((bot.signal_for(reason == 'stop_loss', 0, reason == 'trailing_stop'), symbol))
+                continue
+            work[shard_of(symbol, self.shards)].append(symbol)
+
+        cycle = next(self.cycles)
+        pending = 0
+        for shard, items in enumerate(work):
+            if items:
+                self.commands[shard].put((cycle, items))
+                pending += len(items)
+
+        deadline = time.monotonic() + timeout
+        while pending:
+            try:
+                result = await asyncio.to_thread(self.results.get, True, max(deadline - time.monotonic(), 0.01))
+            except queue.Empty:
+                logger.error(f"{pending} decisions did not come back within {timeout}s")
+                break
+            result_cycle, shard, symbol, score, error = result
+            if result_cycle != cycle:
+                continue  # late answer from a cycle that already timed out
+            pending -= 1
+            if error is not None:
+                logger.error(f"Shard {shard} failed on {symbol}: {error}")
+                continue
+            signal = bot.signal_for(False, self.combine(symbol, score), False)
+            if signal:
+                signals.append((signal, symbol))
+
+        if signals:
+            await asyncio.to_thread(bot.execute_batch, signals, time.perf_counter())
+
+        metrics.observe("cycle.monitor", time.perf_counter() - started)
+        metrics.increment("cycle.symbols", len(positions))
+
+    async def run(self, interval=60):
+        """
+        Sharded replacement for TradingBot.monitor_market.
+        """
+        self.start()
+        try:
+            while self.bot.running:
+                if await asyncio.to_thread(self.bot.is_market_open):
+                    try:
+                        await self.monitor_cycle()
+                    except Exception as e:
+                        logger.error(f"Error monitoring market: {e}")
+                await asyncio.sleep(interval)
+        finally:
+            await asyncio.to_thread(self.stop)
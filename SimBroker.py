@@ -0,0 +1,306 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import defaultdict
+from datetime import timezone
+from types import MappingProxyType, SimpleNamespace
+import numpy as np
+import pandas as pd
+from AlpacaAPI import PositionSnapshot
+from FillLedger import FillLedger
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("SimBroker")
+logger.setLevel(logging.INFO)
+
+
+def synthetic_bars(symbols, length=500, start="2024-10-01", freq="D", seed=0):
+    """
+    Random-walk OHLCV bars for each symbol, shaped like AlpacaAPI.fetch_historical_data output.
+    """
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(start, periods=length, freq=freq, tz=timezone.utc, name='timestamp')
+    bars = {}
+    for symbol in symbols:
+        close = rng.uniform(10, 500) * np.exp(np.cumsum(rng.normal(0.0002, 0.02, length)))
+        open_ = close * (1 + rng.normal(0, 0.005, length))
+        high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, length)))
+        low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, length)))
+        volume = rng.integers(1_000, 1_000_000, length).astype(float)
+        bars[symbol] = pd.DataFrame({
+            'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume,
+            'trade_count': volume // 100, 'vwap': (high + low + close) / 3,
+        }, index=index)
+    return bars
+
+
+class SimBroker:
+    def __init__(self, bars, cash=100_000.0, holdings=None, warmup=50, slippage_bps=5.0,
+                 latency=0.0, sleep=False):
+        """
+        Offline stand-in for AlpacaAPI, driven by recorded or synthetic bars.
+        bars maps symbol -> DataFrame of OHLCV bars; the simulation clock steps through
+        their timestamps, starting after `warmup` bars of history. Market orders queue
+        and fill at the next bar's open, limit orders when the bar trades through the
+        limit, both with slippage_bps against us. Every API call adds `latency` seconds
+        of simulated time (and really sleeps that long if sleep=True).
+        holdings maps symbol -> qty bought at the warmup close, to start with a book.
+        """
+        self.bars = bars
+        self.timeline = sorted(set(itertools.chain.from_iterable(frame.index for frame in bars.values())))
+        self.step = min(warmup, len(self.timeline) - 1)
+        self.cash = float(cash)
+        self.slippage = slippage_bps / 10_000
+        self.latency = latency
+        self.sleep = sleep
+        self.simulated_latency = 0.0
+        self.api_calls = defaultdict(int)
+
+        self.holdings = defaultdict(int)  # symbol -> qty
+        self.orders = []
+        self.pending = []
+        self.order_ids = itertools.count(1)
+
+        # Same state AlpacaAPI keeps
+        self.positions = {}
+        self.ledger = FillLedger(":memory:")
+        self.checkbook = self.ledger.checkbook
+        self.sold_book = self.ledger.sold_book
+        self.snapshot = None
+        self.snapshot_ttl = 0
+
+        for symbol, qty in (holdings or {}).items():
+            order = self.__new_order__(symbol, qty, 'buy', 'market', None)
+            self.__fill__(order, self.__bar__(symbol)['close'])
+
+    # ---- simulation control
+
+    @property
+    def now(self):
+        return self.timeline[self.step]
+
+    def advance(self):
+        """
+        Move the clock to the next bar and match pending orders against it.
+        Returns False once the bars are exhausted.
+        """
+        if self.step + 1 >= len(self.timeline):
+            return False
+        self.step += 1
+        self.snapshot = None
+        self.__match__()
+        return True
+
+    def __call_api__(self, name):
+        self.api_calls[name] += 1
+        self.simulated_latency += self.latency
+        if self.sleep and self.latency:
+            time.sleep(self.latency)
+
+    def __bar__(self, symbol):
+        frame = self.bars[symbol]
+        position = frame.index.searchsorted(self.now, side='right') - 1
+        if position < 0:
+            return None
+        row = frame.iloc[position]
+        return {'open': float(row['open']), 'high': float(row['high']), 'low': float(row['low']),
+                'close': float(row['close']), 'volume': float(row['volume']), 'timestamp': frame.index[position]}
+
+    def __price__(self, symbol):
+        bar = self.__bar__(symbol)
+        return bar['close'] if bar else None
+
+    # ---- order matching
+
+    def __new_order__(self, symbol, qty, side, order_type, limit_price):
+        order = {
+            'id': str(next(self.order_ids)),
+            'symbol': symbol,
+            'qty': int(qty),
+            'side': side,
+            'type': order_type,
+            'limit_price': limit_price,
+            'status': 'new',
+            'filled_qty': 0,
+            'filled_avg_price': None,
+            'submitted_at': self.now,
+            'filled_at': None,
+        }
+        self.orders.append(order)
+        return order
+
+    def __match__(self):
+        still_pending = []
+        for order in self.pending:
+            bar = self.__bar__(order['symbol'])
+            if bar is None or bar['timestamp'] <= order['submitted_at']:
+                still_pending.append(order)
+                continue
+            if order['type'] == 'limit':
+                limit = order['limit_price']
+                crossed = bar['low'] <= limit if order['side'] == 'buy' else bar['high'] >= limit
+                if not crossed:
+                    still_pending.append(order)
+                    continue
+                price = min(bar['open'], limit) if order['side'] == 'buy' else max(bar['open'], limit)
+            else:
+                price = bar['open']
+            self.__fill__(order, price * (1 + self.slippage if order['side'] == 'buy' else 1 - self.slippage))
+        self.pending = still_pending
+
+    def __fill__(self, order, price):
+        symbol, qty = order['symbol'], order['qty']
+        if order['side'] == 'buy':
+            if price * qty > self.cash:
+                order['status'] = 'rejected'
+                return
+            self.cash -= price * qty
+            self.holdings[symbol] += qty
+        else:
+            if self.holdings[symbol] < qty:
+                order['status'] = 'rejected'
+                return
+            self.cash += price * qty
+            self.holdings[symbol] -= qty
+            if not self.holdings[symbol]:
+                del self.holdings[symbol]
+        order.update(status='filled', filled_qty=qty, filled_avg_price=price, filled_at=self.now)
+        self.ledger.record([{'order_id': order['id'], 'symbol': symbol, 'side': order['side'],
+                             'qty': float(qty), 'price': price, 'timestamp': self.now}])
+
+    # ---- AlpacaAPI surface
+
+    def sync_fills(self):
+        return []  # fills go into the ledger as they happen
+
+    def populate_checkbook(self):
+        self.sync_fills()
+
+    def populate_sold_book(self):
+        self.sync_fills()
+
+    def snapshot_positions(self):
+        self.__call_api__('list_positions')
+        positions = {}
+        for symbol, qty in self.holdings.items():
+            price = self.__price__(symbol)
+            positions[symbol] = MappingProxyType({'qty': qty, 'current_price': price, 'market_price': price})
+        self.populate_checkbook()
+        self.snapshot = PositionSnapshot(self.now, MappingProxyType(positions))
+        return self.snapshot
+
+    def fetch_positions(self, max_age=None):
+        if self.snapshot is None or (max_age is not None and max_age <= 0):
+            self.snapshot_positions()
+        self.positions = {symbol: dict(data) for symbol, data in self.snapshot.positions.items()}
+        return self.positions
+
+    def place_order(self, symbol, qty, side="buy", order_type="market", time_in_force="gtc", limit_price=None):
+        self.__call_api__('submit_order')
+        order = self.__new_order__(symbol, qty, side, order_type, limit_price)
+        self.pending.append(order)
+        self.snapshot = None
+        return SimpleNamespace(**order)
+
+    def fetch_recent_orders(self, after=None):
+        self.__call_api__('list_orders')
+        return [SimpleNamespace(**order) for order in self.orders
+                if after is None or order['submitted_at'] > pd.Timestamp(after)]  # exclusive, like list_orders
+
+    def calculate_portfolio_value(self):
+        self.__call_api__('get_account')
+        return self.cash + sum(qty * self.__price__(symbol) for symbol, qty in self.holdings.items())
+
+    def get_account_info(self, max_age=None):
+        value = self.calculate_portfolio_value()
+        return SimpleNamespace(cash=self.cash, portfolio_value=value, buying_power=self.cash)
+
+    def fetch_historical_data(self, symbol, start_date, adjustment='all'):
+        """
+        Bars from start_date up to, but not including, the current bar (the live API stops at yesterday).
+        """
+        self.__call_api__('get_bars')
+        return self.__history__(symbol, start_date)
+
+    def __history__(self, symbol, start_date):
+        frame = self.bars[symbol]
+        start = pd.Timestamp(start_date, tz=frame.index.tz)
+        return frame[(frame.index >= start) & (frame.index < self.now)]
+
+    def fetch_historical_batch(self, symbols, start_date, adjustment='all', chunk_size=200):
+        for first in range(0, len(symbols), chunk_size):
+            self.__call_api__('get_bars')
+        return {symbol: self.__history__(symbol, start_date) for symbol in symbols}
+
+    def fetch_tradable_symbols(self):
+        self.__call_api__('list_assets')
+        return sorted(self.bars)
+
+    def fetch_intraday_bars(self, symbol, start, end, bar_seconds=60):
+        self.__call_api__('get_bars')
+        frame = self.bars[symbol]
+        return frame[(frame.index >= pd.Timestamp(start)) & (frame.index <= pd.Timestamp(end))]
+
+    def fetch_raw_data(self, symbol):
+        self.__call_api__('get_latest_bar')
+        return self.__bar__(symbol)
+
+    def fetch_all_transactions(self, status='filled', limit=None):
+        return self.ledger.transactions(limit=limit)
+
+    def is_market_open(self):
+        self.__call_api__('get_clock')
+        return self.step + 1 < len(self.timeline)
+
+    def seconds_until_open(self):
+        return 0.0
+
+
+async def run_simulation(bot, broker, cycles=None):
+    """
+    Drive the bot's real monitor loop against a SimBroker, one bar per cycle, as fast as
+    the bot can go. Returns throughput and outcome statistics.
+    """
+    started = time.perf_counter()
+    starting_value = broker.calculate_portfolio_value()
+    count = 0
+    while (cycles is None or count < cycles) and broker.advance():
+        await bot.monitor_cycle()
+        count += 1
+    elapsed = time.perf_counter() - started
+    filled = [order for order in broker.orders if order['status'] == 'filled']
+    return {
+        'cycles': count,
+        'symbols': len(broker.bars),
+        'wall_seconds': elapsed,
+        'cycles_per_second': count / elapsed if elapsed else 0.0,
+        'api_calls': dict(broker.api_calls),
+        'simulated_latency': broker.simulated_latency,
+        'orders_filled': len(filled),
+        'orders_rejected': sum(order['status'] == 'rejected' for order in broker.orders),
+        'starting_value': starting_value,
+        'ending_value': broker.calculate_portfolio_value(),
+    }
+
+
+# Example usage
+if __name__ == "__main__":
+    from TradingBot import TradingBot
+    from BacktestManager import BacktestManager
+    from Posman import Posman
+    from strategies import *
+
+    symbols = [f"SYM{i:03d}" for i in range(500)]
+    broker = SimBroker(synthetic_bars(symbols, length=300), cash=1_000_000,
+                       holdings={symbol: 5 for symbol in symbols}, latency=0.05)
+    bot = TradingBot(broker, max_concurrency=32)
+    bot.__setPosman__(Posman(bot))
+    bot.__setBacktestManager__(BacktestManager([
+        (moving_average_crossover, 1.5),
+        (volatility_calculator, 1.0),
+        (macd_strategy, 1.2),
+        (mean_reversion_strategy, 1.2),
+        (rsi_strategy, 1.1),
+    ], bot))
+    print(asyncio.run(run_simulation(bot, broker, cycles=20)))
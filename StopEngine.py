@@ -0,0 +1,110 @@
+import logging
+from Metrics import metrics
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("StopEngine")
+logger.setLevel(logging.INFO)
+
+
+class Stop:
+    __slots__ = ('entry', 'high', 'floor', 'level', 'crossed')
+
+    def __init__(self, entry, high, floor, level):
+        """
+        Stop state of one position: entry price, high-water mark since entry, the fixed
+        stop-loss price, the current stop level (the higher of the floor and the trail) and
+        whether the price is below it.
+        """
+        self.entry = entry
+        self.high = high
+        self.floor = floor
+        self.level = level
+        self.crossed = False
+
+
+class StopEngine:
+    def __init__(self, risk_threshold=0.05, trailing_threshold=0.075):
+        """
+        Stop-loss and trailing-stop levels for every held position, kept in memory.
+        A position is armed with its entry price; each price update moves its high-water mark
+        and stop level in O(1) and reports whether the stop was crossed. Nothing here calls
+        the API, so a trade tick or a polled price is checked the moment it arrives.
+        The stop-loss sits risk_threshold below entry, the trailing stop trailing_threshold
+        below the highest price seen since entry.
+        """
+        self.risk_threshold = risk_threshold
+        self.trailing_threshold = trailing_threshold
+        self.stops = {}  # symbol -> Stop
+
+    def __len__(self):
+        return len(self.stops)
+
+    def __contains__(self, symbol):
+        return symbol in self.stops
+
+    def arm(self, symbol, entry_price, price=None):
+        """
+        Starts (or restarts) tracking a position bought at entry_price.
+        """
+        entry_price = float(entry_price)
+        high = max(entry_price, float(price)) if price is not None else entry_price
+        floor = entry_price * (1 - self.risk_threshold)
+        self.stops[symbol] = Stop(entry_price, high, floor, max(floor, high * (1 - self.trailing_threshold)))
+
+    def release(self, symbol):
+        """
+        Stops tracking symbol (sold, or no longer held).
+        """
+        self.stops.pop(symbol, None)
+
+    def retain(self, symbols):
+        """
+        Releases every tracked symbol not in symbols.
+        """
+        for symbol in [symbol for symbol in self.stops if symbol not in symbols]:
+            del self.stops[symbol]
+
+    def level(self, symbol):
+        """
+        Current stop price for symbol, or None if it is not tracked.
+        """
+        stop = self.stops.get(symbol)
+        return stop.level if stop is not None else None
+
+    def high_water(self, symbol):
+        stop = self.stops.get(symbol)
+        return stop.high if stop is not None else None
+
+    def update(self, symbol, price, entry_price=None):
+        """
+        Feeds one price for symbol. Returns 'stop_loss' or 'trailing_stop' while the price is
+        below the stop, else None. The stop stays armed until release() (once the sell is
+        accepted), so a rejected or skipped sell fires again on the next price.
+        entry_price, if given, arms an untracked symbol and re-arms one whose entry changed
+        (e.g. after a rebuy), keeping its high-water mark.
+        """
+        stop = self.stops.get(symbol)
+        if entry_price is not None and (stop is None or stop.entry != entry_price):
+            high = stop.high if stop is not None else None
+            self.arm(symbol, entry_price, price if high is None else max(high, price))
+            stop = self.stops[symbol]
+        elif stop is None:
+            return None
+
+        if price > stop.high:
+            stop.high = price
+            trail = price * (1 - self.trailing_threshold)
+            if trail > stop.level:
+                stop.level = trail
+            return None
+        if price >= stop.level:
+            stop.crossed = False
+            return None
+
+        reason = 'stop_loss' if price < stop.floor else 'trailing_stop'
+        if not stop.crossed:
+            stop.crossed = True
+            metrics.increment(f"stops.{reason}")
+            logger.info(f"{symbol} crossed its {reason.replace('_', ' ')} at {price} "
+                        f"(entry {stop.entry}, high {stop.high}, stop {stop.level:.4f})")
+        return reason
@@ -6,16 +6,22 @@ from AlpacaAPI import *
 import asyncio
 import pandas as pd
 import threading
-from config import ALPACA_API_KEY
-from config import ALPACA_SECRET_KEY
 import logging
 import sys
 import alpaca_trade_api as trade_api
-from datetime import date, timezone, datetime
+from datetime import date, timedelta, timezone, datetime
 import BacktestManager
 from BacktestManager import BacktestManager
 from strategies import *
 from Posman import Posman
+from MarketStream import MarketStream
+from BarAggregator import BarAggregator
+from PriceHistory import PriceHistory
+from Metrics import metrics
+from OrderManager import OrderManager
+from StopEngine import StopEngine
+import time
+import json
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("TradingBot")#="TradingBot"
@@ -33,16 +39,28 @@ logger.setLevel(logging.INFO)
 
 
 class TradingBot:
-    def __init__(self, alpaca_api, backtests=None, posman=None):
+    def __init__(self, alpaca_api, backtests=None, posman=None, max_concurrency=8):
         """
         Initialize TradingBot with Alpaca API keys and create an Alpaca API instance.
+        max_concurrency caps how many symbols make REST calls at the same time.
         """
         self.alpaca = alpaca_api
         self.btm = backtests
         self.posman = posman
         self.logger = logger
         self.running = True
+        self.streaming = False  # score from incremental indicator state fed one-minute bars by fetch_raw_data
+        self.feed_factory = None  # set to stream market data instead of polling (see stream_market)
+        self.stream = None
+        self.scanner = None  # UniverseScanner; when set, run() also looks for new entries
+        self.aggregator = BarAggregator()  # 1m..1d bars built from every live bar the bot sees
+        self.histories = {}  # symbol -> PriceHistory of daily bars, extended in place each cycle
+        self.runtime = None  # ShardedRuntime; when set it replaces monitor_market
+        self.orders = OrderManager(alpaca_api)
+        self.stops = StopEngine()  # high-water marks and stop levels, checked on every price
+        self.recorder = None  # Recorder (or ReplayBroker) told about cycles and decisions
         self.lock = threading.Lock()
+        self.max_concurrency = max_concurrency
         
 
     def __setPosman__(self, posman):
@@ -64,27 +82,37 @@ class TradingBot:
         checks if the stock market is open
         """
         try:
-            api = trade_api.REST(ALPACA_API_KEY, ALPACA_SECRET_KEY, base_url="https://paper-api.alpaca.markets")
-            clock = api.get_clock()
-            return clock.is_open
+            return self.alpaca.is_market_open()
         except Exception as e:
             logger.error(f"Error checking market status: {e}")
             return False
 
 
+    def seconds_until_open(self):
+        """
+        how long to sleep before the market opens, from the cached clock
+        """
+        try:
+            return max(self.alpaca.seconds_until_open(), 1.0)
+        except Exception as e:
+            logger.error(f"Error checking market hours: {e}")
+            return 60.0
+
+
     async def update_live_data(self):
         """
         periodically fetches updated market data
         """
         while self.running:
-            if not self.is_market_open():
-                logger.info("Market is closed. Skipping live data updates...")  
-                asyncio.sleep(60)  # loop condition, as averse to 'return'
+            if not await asyncio.to_thread(self.is_market_open):
+                wait = await asyncio.to_thread(self.seconds_until_open)
+                logger.info(f"Market is closed. Skipping live data updates for {wait:.0f}s...")  
+                await asyncio.sleep(wait)  # loop condition, as averse to 'return'
                 continue  
             
             try:
                 # Fetch positions
-                self.alpaca.fetch_positions()
+                await asyncio.to_thread(self.alpaca.fetch_positions)
                 logger.info("Fetched positions succesfully\n")
             except Exception as e:
                 logger.error(f"Error fetching live data: {e}")
@@ -98,97 +126,255 @@ class TradingBot:
         """  
         while self.running:
             try:
-                positions = self.alpaca.fetch_positions()   
-                logger.debug(f"Fetched positions: {positions}")      
-                if not positions:
-                    logger.info("No positions to monitor")
-                    asyncio.sleep(60)
-                    continue
-
-                for symbol, position_data in positions.items():
-
-                    qty = int(position_data['qty'])
-                    current_price = float(position_data['current_price'])
-                    mrkt_price = float(position_data['market_price'])
-
-                    logger.info(f"Monitoring {symbol}: qty={qty}, price={mrkt_price}")
-
-                    if symbol in self.alpaca.checkbook:
-                        buy_price = self.alpaca.checkbook[symbol][-1]
-                        data = self.alpaca.fetch_historical_data(symbol, "2024-10-01")
-
-                        backtest = self.backtest_strategy(symbol=symbol)
-
-                        if mrkt_price < self.posman.calculate_stop_loss(buy_price) or backtest <-.45 or self.calculate_trailing_stop(symbol=symbol):#cahgne trailing stop to be open price
-                            print(f"mrkt_price < buy_price: {mrkt_price < self.posman.calculate_stop_loss(buy_price)}")
-                            print(f"Backtesting: {backtest}")
-                            print(f"trailing_stop: {self.calculate_trailing_stop(symbol=symbol)}")
-                            try:
-                                self.execute_trades(-1, symbol=symbol)
-                                self.alpaca.fetch_positions()
-                            except Exception as e:
-                                logger.error(f"Error placing SELL order for {symbol}: {e}")
-                        elif backtest > 0.25:             # buy if it is advantageous
-                            print("Buying")
-                            logger.debug(f"Running backtest for {symbol} with price {mrkt_price} and buy price {self.alpaca.checkbook[symbol]}")
-                            try:
-                                self.execute_trades(1, symbol=symbol) 
-                            except Exception as e:
-                                logger.error(f"Error placing BUY order for {symbol}: {e}")
-                        else:
-                            print("Skipping\n")
-                            continue
-                    else:
-                        logger.warning(f"{symbol} not found in checkbook during monitoring.\n")
-                           
+                await self.monitor_cycle()
                 await asyncio.sleep(60)
             except Exception as e:
                 logger.error(f"Error monitoring market: {e}")
 
 
+    async def monitor_cycle(self):
+        """
+        One pass of monitor_market over every held symbol.
+        """
+        started = time.perf_counter()
+        if self.recorder is not None:
+            self.recorder.begin_cycle()
+        await asyncio.to_thread(self.orders.poll)  # fills since the last cycle, one request
+        positions = await asyncio.to_thread(self.alpaca.fetch_positions)
+        logger.debug(f"Fetched positions: {positions}")      
+        if not positions:
+            logger.info("No positions to monitor")
+            return
+        self.stops.retain(positions)
+
+        # Symbols are evaluated concurrently; blocking REST calls run in worker threads,
+        # at most max_concurrency at a time. The cycle's orders then go out as one batch.
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        decisions = await asyncio.gather(*(
+            self.monitor_symbol(symbol, position_data, semaphore)
+            for symbol, position_data in positions.items()
+        ))
+        signal_time = time.perf_counter()
+        signals = [(self.signal_for(*decision), symbol) for symbol, decision in filter(None, decisions)]
+        signals = [(signal, symbol) for signal, symbol in signals if signal]
+        if signals:
+            await asyncio.to_thread(self.execute_batch, signals, signal_time)
+        metrics.observe("cycle.monitor", time.perf_counter() - started)
+        metrics.increment("cycle.symbols", len(positions))
+
+
+    async def monitor_symbol(self, symbol, position_data, semaphore):
+        """
+        Fetch, score and decide for a single held symbol. Returns (symbol, decision), or None.
+        Errors are logged and give None, so one bad symbol never costs the rest of the cycle.
+        """
+        try:
+            qty = int(position_data['qty'])
+            current_price = float(position_data['current_price'])
+            mrkt_price = float(position_data['market_price'])
+
+            logger.info(f"Monitoring {symbol}: qty={qty}, price={mrkt_price}")
+            self.posman.mark(symbol, mrkt_price)
+
+            if symbol not in self.alpaca.checkbook:
+                logger.warning(f"{symbol} not found in checkbook during monitoring.\n")
+                return
+
+            buy_price = self.alpaca.checkbook[symbol][-1]
+            reason = self.stops.update(symbol, mrkt_price, buy_price)
+            if reason is not None:
+                return symbol, (reason == 'stop_loss', 0, reason == 'trailing_stop')
+            async with semaphore:
+                backtest = await asyncio.to_thread(self.backtest_strategy, symbol)
+
+            return symbol, (False, backtest, False)
+        except Exception as e:
+            logger.error(f"Error monitoring {symbol}: {e}")
+            return None
+
+
+    def signal_for(self, stop_loss_hit, backtest, trailing_stop):
+        """
+        Sells (-1) on any stop or a weak score, buys (1) on a strong one, else 0.
+        """
+        if stop_loss_hit or backtest <-.45 or trailing_stop:
+            print(f"mrkt_price < buy_price: {stop_loss_hit}")
+            print(f"Backtesting: {backtest}")
+            print(f"trailing_stop: {trailing_stop}")
+            return -1
+        elif backtest > 0.25:             # buy if it is advantageous
+            print("Buying")
+            return 1
+        print("Skipping\n")
+        return 0
+
+
+    async def act_on_signals(self, symbol, stop_loss_hit, backtest, trailing_stop):
+        """
+        Sells on any stop or a weak score, buys on a strong one.
+        """
+        signal_time = time.perf_counter()
+        signal = self.signal_for(stop_loss_hit, backtest, trailing_stop)
+        if signal:
+            try:
+                await asyncio.to_thread(self.execute_trades, signal, symbol, signal_time)
+            except Exception as e:
+                logger.error(f"Error placing {'BUY' if signal == 1 else 'SELL'} order for {symbol}: {e}")
+
+
+    async def stream_market(self):
+        """
+        Event-driven alternative to update_live_data + monitor_market: stops are checked on
+        every trade and strategies are scored on every completed bar from the market stream.
+        """
+        positions = await asyncio.to_thread(self.alpaca.fetch_positions)
+        self.stream = MarketStream(self.alpaca, self.feed_factory, positions,
+                                   on_trade=self.on_stream_trade, on_bar=self.on_stream_bar,
+                                   on_order_update=self.orders.on_trade_update)
+        await self.stream.run()
+
+
+    async def on_stream_trade(self, symbol, price):
+        """
+        Checks the stop loss and trailing stop against a streamed trade price, no REST calls.
+        """
+        position = self.alpaca.positions.get(symbol)
+        if position is None or symbol not in self.alpaca.checkbook:
+            return
+        position['market_price'] = price
+        self.posman.mark(symbol, price)
+        reason = self.stops.update(symbol, price, self.alpaca.checkbook[symbol][-1])
+        if reason is not None:
+            await self.act_on_signals(symbol, reason == 'stop_loss', 0, reason == 'trailing_stop')
+
+
+    async def on_stream_bar(self, symbol, bar):
+        """
+        Advances the streaming indicators with a completed bar and trades on the new score.
+        """
+        self.aggregator.add_bar(symbol, bar)
+        if symbol not in self.alpaca.checkbook:
+            return
+        history = await asyncio.to_thread(self.streaming_seed, symbol, self.stream.builder.bar_seconds)
+        score = await asyncio.to_thread(self.btm.execute_streaming, symbol, bar, history)
+        logger.info(f"Streaming score for {symbol} at {bar['timestamp']}: Score={score:.2f}")
+        await self.act_on_signals(symbol, False, score, False)
+
+
+    async def scan_market(self, interval=3600):
+        """
+        periodically scores the scanner's universe and buys the top candidates not yet held
+        """
+        while self.running:
+            if await asyncio.to_thread(self.is_market_open):
+                try:
+                    candidates = await asyncio.to_thread(self.scanner.scan, exclude=set(self.alpaca.positions))
+                    for symbol, score in candidates:
+                        logger.info(f"Scanner candidate {symbol}: Score={score:.2f}")
+                        await self.act_on_signals(symbol, False, score, False)
+                except Exception as e:
+                    logger.error(f"Error scanning market: {e}")
+            await asyncio.sleep(interval)
+
+
     def backtest_strategy(self, symbol):
         """
         Backtests market conditions to make trade decisions
         """
-        raw_data = self.alpaca.fetch_historical_data(symbol,"2024-10-01")
+        if self.streaming:
+            bar = self.alpaca.fetch_raw_data(symbol=symbol)
+            if bar is None:
+                logger.warning(f"No live bar for {symbol}.")
+                return False
+            self.aggregator.add_bar(symbol, bar)
+            decision_score = self.btm.execute_streaming(symbol, bar, self.streaming_seed(symbol))  # one-minute bars
+            logger.info(f"Streaming score for {symbol} at {datetime.now()}: Score={decision_score:.2f}")
+            return decision_score
+
+        raw_data = self.history_for(symbol)
         if raw_data.empty:
             logger.warning(f"No historical data for {symbol}.")
             return False
         
-        decision_score = btm.execute_strategies(symbol, raw_data)
+        decision_score = self.btm.execute_strategies(symbol, raw_data)
         logger.info(f"Backtest result for {symbol} at {datetime.now()}: Score={decision_score:.2f}")
         
         return decision_score 
 
 
-    def execute_trades(self, signal, symbol):
+    def streaming_seed(self, symbol, bar_seconds=60, days=7):
+        """
+        Intraday history to warm a symbol's streaming indicators with, on its first bar only;
+        a cold state would score (and sell) on a handful of bars. The state is advanced with
+        bar_seconds bars, so it is seeded with bars of the same length from the last `days`
+        calendar days, never with daily ones.
+        """
+        if symbol in self.btm.streams:
+            return None
+        start = pd.Timestamp(date.today() - timedelta(days=days), tz='UTC')
+        return self.alpaca.fetch_intraday_bars(symbol, start, start + pd.Timedelta(days=days + 1), bar_seconds)
+
+
+    def history_for(self, symbol, start_date="2024-10-01"):
+        """
+        Daily bars for symbol in a PriceHistory that lives across cycles: the first call loads
+        from start_date, later ones ask from the newest bar held onwards. If that overlapping
+        bar changed (the history was re-adjusted), the whole history is reloaded.
+        """
+        history = self.histories.get(symbol)
+        if history is not None and not history.empty:
+            since = pd.Timestamp(history.last_timestamp(), tz='UTC').strftime("%Y-%m-%d")
+            bars = self.alpaca.fetch_historical_data(symbol, since)
+            if history.agrees_with(bars):
+                history.extend(bars)
+                return history
+            logger.info(f"History for {symbol} was re-adjusted, reloading from {start_date}")
+        history = self.histories[symbol] = PriceHistory(symbol)
+        history.extend(self.alpaca.fetch_historical_data(symbol, start_date))
+        return history
+
+
+    def execute_trades(self, signal, symbol, signal_time=None):
         """
         Execute trades based on the signal. Signal:
         <>  1: Buy
         <> -1: Sell
+        signal_time (time.perf_counter() when the signal fired) feeds the signal-to-order latency metric.
         """
-        with self.lock:
-            self.alpaca.fetch_positions()
-            logger.info(f"Processing signal {signal} for {symbol}")
-            logger.debug(f"Signal {signal} for {symbol}, attempting to place order.")
-
-            if signal == 1:  # BUY
-                qty = 1
-                logger.info(f"Placing BUY order for {symbol}")
-                self.alpaca.place_order(symbol, qty=qty, side="buy")
-                # Update Checkbook
-                position = self.alpaca.positions.get(symbol)
-                if position:
-                    self.alpaca.checkbook[symbol] = position[1]
+        self.execute_batch([(signal, symbol)], signal_time)
 
-            elif signal == -1:  # SELL
-                logger.info(f"Placing SELL order for {symbol}")
-                self.alpaca.place_order(symbol, qty=1, side="sell")
-                #Update Checkbook
-                if symbol in self.alpaca.checkbook:
-                    del self.alpaca.checkbook[symbol]
 
-            print(f"Trade for {symbol} completed. Notifying other threads.\n")
+    def execute_batch(self, signals, signal_time=None):
+        """
+        Places one order per (signal, symbol) concurrently. Symbols that already have an order
+        working are skipped. Positions, the checkbook and the lot book are updated from the
+        fills as the OrderManager sees them, not by re-listing positions.
+        """
+        waited = time.perf_counter()
+        with self.lock:
+            metrics.observe("lock.wait", time.perf_counter() - waited)
+            if self.recorder is not None:
+                self.recorder.decisions(signals)
+            requests = []
+            for signal, symbol in signals:
+                logger.info(f"Processing signal {signal} for {symbol}")
+                if self.orders.pending(symbol):
+                    logger.info(f"Order already working for {symbol}, skipping signal {signal}")
+                    continue
+                side = "buy" if signal == 1 else "sell"
+                logger.info(f"Placing {side.upper()} order for {symbol}")
+                requests.append((symbol, 1, side))
+
+            for order in self.orders.submit_batch(requests, signal_time):
+                if order['side'] == "sell":
+                    self.stops.release(order['symbol'])
+                    #Update Checkbook: drop the symbol once sold out, otherwise keep its buy prices
+                    held = float(self.alpaca.positions.get(order['symbol'], {}).get('qty', 0))
+                    if held - (order['qty'] - order['filled_qty']) > 0:  # positions already reflect any fill
+                        self.alpaca.ledger.restore_checkbook(order['symbol'])
+                    elif order['symbol'] in self.alpaca.checkbook:
+                        del self.alpaca.checkbook[order['symbol']]
+                print(f"Trade for {order['symbol']} completed. Notifying other threads.\n")
 
 
     async def evaluate_rebuy_opportunities(self):
@@ -213,32 +399,33 @@ class TradingBot:
                 logger.error(f"Error evaluating rebuy opportunities: {e}")
 
 
-    def calculate_trailing_stop(self, symbol):
-        """ Part of the sell logic, 
-            will sell if stock dips below peak to maximize gains, 
-            hopefully to be rebought in the future """
-        raw_data = self.alpaca.fetch_raw_data(symbol=symbol)
-        sell_price = self.posman.calculate_stop_loss(raw_data['open'], .075)# default .05 risk threshold
-
-        data = self.alpaca.fetch_positions()
-        current_price = data[symbol]['market_price']
-
-        return sell_price > current_price
-
-    
     async def run(self):
         """
         Starts the bot for all positions.
         """
         #positions = self.alpaca.fetch_positions()
         #symbols = list(positions.keys())
-        tasks = [
-            self.safe_task(self.update_live_data),    
-            self.safe_task(self.monitor_market),
-            #self.safe_task(self.evaluate_rebuy_opportunities),
-            ]
+        if self.feed_factory is not None:
+            tasks = [self.safe_task(self.stream_market), self.safe_task(self.report_metrics)]
+        else:
+            tasks = [
+                self.safe_task(self.update_live_data),    
+                self.safe_task(self.runtime.run if self.runtime is not None else self.monitor_market),
+                self.safe_task(self.report_metrics),
+                #self.safe_task(self.evaluate_rebuy_opportunities),
+                ]
+        if self.scanner is not None:
+            tasks.append(self.safe_task(self.scan_market))
         await asyncio.gather(*tasks)
 
+    async def report_metrics(self, interval=300):
+        """
+        periodically dumps latency histograms and counters to the log
+        """
+        while self.running:
+            await asyncio.sleep(interval)
+            logger.info(f"Metrics: {json.dumps(metrics.snapshot())}")
+
     async def safe_task(self, func, *args):
         """
         runs the tasks in an environment that will deal with any errors that arise
@@ -250,7 +437,28 @@ class TradingBot:
             self.running = False
 
 
+def build_bot(alpaca):
+    """
+    Wires a TradingBot to a broker the way a live session runs: fills synced, Posman and the
+    default strategy stack plus the position sizing vote. Replays build the same bot.
+    """
+    bot = TradingBot(alpaca)
+    bot.alpaca.populate_checkbook()
+    bot.alpaca.populate_sold_book()
+    posman = Posman(bot)
+    bot.__setPosman__(posman)
+    portfolio_value = bot.alpaca.calculate_portfolio_value()
+    available_cash = bot.posman.available_funds()
+    position_sizing = lambda symbol, data: bot.posman.position_sizing_strategy(symbol, portfolio_value, available_cash)
+    btm = BacktestManager(default_strategies() + [(position_sizing, 1.4)], bot)
+    btm.invalidate_on(bot.alpaca.ledger.listeners, position_sizing)  # its vote moves with the position, not the bars
+    bot.__setBacktestManager__(btm)
+    return bot
+
+
 if __name__ == "__main__":
+    from config import ALPACA_API_KEY
+    from config import ALPACA_SECRET_KEY
 
     
     def signal_handler(signal, frame):
@@ -266,23 +474,34 @@ if __name__ == "__main__":
     signal.signal(signal.SIGTERM, signal_handler)
 
     # START REAL ********
-    alpaca = AlpacaAPI(ALPACA_API_KEY, ALPACA_SECRET_KEY)
-    bot = TradingBot(alpaca)
-    bot.alpaca.populate_checkbook()
-    bot.alpaca.populate_sold_book()
-    posman = Posman(bot)
-    bot.__setPosman__(posman)
-    portfolio_value = bot.alpaca.calculate_portfolio_value()
-    available_cash = bot.posman.available_funds()
-    btm = BacktestManager([
-            (moving_average_crossover, 1.5),
-                (volatility_calculator,1.0),
-                    (macd_strategy,1.2),
-                        (mean_reversion_strategy,1.2),
-                            (rsi_strategy,1.1),
-                                ((lambda symbol, data: bot.posman.position_sizing_strategy(symbol, portfolio_value, available_cash)),1.4)
-                                    ], bot)
-    bot.__setBacktestManager__(btm)
+    # With --shards N the account's 200 requests/minute are split between this process and N workers
+    shards = int(sys.argv[sys.argv.index("--shards") + 1]) if "--shards" in sys.argv else 0
+    alpaca = AlpacaAPI(ALPACA_API_KEY, ALPACA_SECRET_KEY, requests_per_minute=200 // (shards + 1))
+    if "--record" in sys.argv:
+        # Log every broker response for Recorder.replay; e.g. --record session.rec
+        from Recorder import Recorder
+        alpaca = Recorder(alpaca, sys.argv[sys.argv.index("--record") + 1])
+    bot = build_bot(alpaca)
+    bot.recorder = alpaca if "--record" in sys.argv else None
+    btm = bot.btm
+
+    if "--metrics" in sys.argv:
+        metrics.serve(9100)  # http://127.0.0.1:9100/metrics
+
+    if "--stream" in sys.argv:
+        bot.feed_factory = lambda: trade_api.Stream(ALPACA_API_KEY, ALPACA_SECRET_KEY,
+                                                    base_url="https://paper-api.alpaca.markets", data_feed='iex')
+
+    if shards:
+        from functools import partial
+        from ShardedRuntime import ShardedRuntime, shard_broker
+        broker_factory = partial(shard_broker, api_key=ALPACA_API_KEY, secret_key=ALPACA_SECRET_KEY,
+                                 requests_per_minute=200 // (shards + 1))
+        bot.runtime = ShardedRuntime(bot, broker_factory, default_strategies, shards)
+
+    if "--scan" in sys.argv:
+        from UniverseScanner import UniverseScanner
+        bot.scanner = UniverseScanner(alpaca, btm.strategies)
 
     if not bot.is_market_open():
         logger.info("Market is closed. Exiting bot.")
@@ -0,0 +1,132 @@
+import logging
+import time
+from collections import defaultdict
+from datetime import date
+import numpy as np
+from indicators import IndicatorEngine
+from strategies import signal_series
+from Metrics import metrics
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("UniverseScanner")
+logger.setLevel(logging.INFO)
+
+FIELDS = ('open', 'high', 'low', 'close')
+
+
+def pack_panels(bars, fields=FIELDS, lookback=None):
+    """
+    Packs {symbol: DataFrame} (or PriceHistory) into 2-D arrays (symbols x bars), one panel per
+    history length, so every row holds a symbol's complete history with no padding and panel
+    indicators match the per-symbol ones exactly. lookback keeps only each symbol's last
+    `lookback` bars. Returns a list of (symbols, {field: array}).
+    """
+    by_length = defaultdict(list)
+    for symbol, frame in bars.items():
+        if frame is not None and len(frame):
+            by_length[len(frame) if lookback is None else min(len(frame), lookback)].append(symbol)
+
+    panels = []
+    for length, symbols in sorted(by_length.items()):
+        panel = {field: np.empty((len(symbols), length)) for field in fields}
+        for row, symbol in enumerate(symbols):
+            for field in fields:
+                panel[field][row] = np.asarray(bars[symbol][field], dtype=float)[len(bars[symbol]) - length:]
+        panels.append((symbols, panel))
+    return panels
+
+
+class UniverseScanner:
+    def __init__(self, alpaca, strategies, start_date="2024-10-01", buy_threshold=0.25,
+                 max_candidates=20, min_price=1.0):
+        """
+        Scores the strategy stack over a whole universe of symbols at once.
+        Daily bars come from alpaca.fetch_historical_batch (cache-backed, one request per
+        chunk of symbols for whatever is missing), are packed into symbols x bars panels, and
+        each strategy's signal series runs once per panel. Strategies without a signal series
+        (e.g. the position sizing lambda, which needs a held position) are left out of the
+        weighted average.
+        """
+        self.alpaca = alpaca
+        self.strategies = strategies
+        self.start_date = start_date
+        self.buy_threshold = buy_threshold
+        self.max_candidates = max_candidates
+        self.min_price = min_price
+        self.symbols = None  # (date, symbols) of the last universe listing
+
+    def universe(self):
+        """
+        Tradable symbols, listed at most once a day.
+        """
+        today = date.today()
+        if self.symbols is None or self.symbols[0] != today:
+            self.symbols = (today, self.alpaca.fetch_tradable_symbols())
+            logger.info(f"Universe has {len(self.symbols[1])} tradable symbols")
+        return self.symbols[1]
+
+    def score_panel(self, panel):
+        """
+        Weighted strategy score of the last bar for every row of a panel, averaged over the
+        strategies that have a signal series.
+        """
+        indicators = IndicatorEngine(panel)
+        total_score = np.zeros(len(panel['close']))
+        total_weight = 0
+        for strategy, weight in self.strategies:
+            series = signal_series(strategy)
+            if series is not None:
+                total_score += np.nan_to_num(series(indicators)[..., -1]) * weight
+                total_weight += weight
+        return total_score / total_weight if total_weight > 0 else total_score
+
+    def score(self, bars):
+        """
+        {symbol: score} for a {symbol: DataFrame} of daily bars.
+        """
+        scores = {}
+        for symbols, panel in pack_panels(bars):
+            scores.update(zip(symbols, self.score_panel(panel).tolist()))
+        return scores
+
+    def scan(self, symbols=None, exclude=()):
+        """
+        Ranked buy candidates: [(symbol, score)] above buy_threshold, best first, at most
+        max_candidates, skipping symbols in exclude and closes under min_price.
+        symbols defaults to the whole tradable universe.
+        """
+        started = time.perf_counter()
+        exclude = set(exclude)
+        symbols = [symbol for symbol in (symbols if symbols is not None else self.universe()) if symbol not in exclude]
+        bars = self.alpaca.fetch_historical_batch(symbols, self.start_date)
+        bars = {symbol: frame for symbol, frame in bars.items()
+                if len(frame) and float(frame['close'].iloc[-1]) >= self.min_price}
+        loaded = time.perf_counter()
+
+        scores = self.score(bars)
+        ranked = sorted(((symbol, score) for symbol, score in scores.items() if score > self.buy_threshold),
+                        key=lambda item: item[1], reverse=True)[:self.max_candidates]
+
+        metrics.observe("scanner.load", loaded - started)
+        metrics.observe("scanner.score", time.perf_counter() - loaded)
+        metrics.set_gauge("scanner.symbols", len(scores))
+        logger.info(f"Scanned {len(scores)} symbols in {time.perf_counter() - started:.2f}s, "
+                    f"{len(ranked)} candidates")
+        return ranked
+
+
+# Example usage
+if __name__ == "__main__":
+    from SimBroker import SimBroker, synthetic_bars
+    from strategies import *
+
+    broker = SimBroker(synthetic_bars([f"SYM{i:04d}" for i in range(5000)], length=300), warmup=299)
+    scanner = UniverseScanner(broker, [
+        (moving_average_crossover, 1.5),
+        (volatility_calculator, 1.0),
+        (macd_strategy, 1.2),
+        (mean_reversion_strategy, 1.2),
+        (rsi_strategy, 1.1),
+    ])
+    for symbol, score in scanner.scan():
+        print(f"{symbol}: {score:.2f}")
@@ -0,0 +1,166 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import indicators
+from BacktestManager import BacktestManager
+from Posman import Posman
+from SimBroker import SimBroker, synthetic_bars, run_simulation
+from TradingBot import TradingBot
+from strategies import *
+
+STRATEGIES = [
+    (moving_average_crossover, 1.5),
+    (volatility_calculator, 1.0),
+    (macd_strategy, 1.2),
+    (mean_reversion_strategy, 1.2),
+    (rsi_strategy, 1.1),
+]
+
+
+def time_calls(func, repeat):
+    """
+    Runs func `repeat` times and returns timing stats in microseconds.
+    """
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1e6)
+    return {
+        'min_us': min(samples),
+        'median_us': statistics.median(samples),
+        'mean_us': statistics.fmean(samples),
+        'repeat': repeat,
+    }
+
+
+def cold(func):
+    """
+    Wraps func so every call starts with an empty indicator cache, measuring the full computation.
+    """
+    def run():
+        indicators.clear_cache()
+        func()
+    return run
+
+
+def bench_strategies(bars, repeat):
+    symbol, data = next(iter(bars.items()))
+    results = {}
+    for strategy, _ in STRATEGIES:
+        results[strategy.__name__] = {
+            'cold': time_calls(cold(lambda: strategy(symbol, data)), repeat),
+            'warm': time_calls(lambda: strategy(symbol, data), repeat),
+        }
+    return results
+
+
+def bench_weighted_score(bars, repeat):
+    manager = BacktestManager(list(STRATEGIES), None)
+    items = list(bars.items())
+
+    def score_all():
+        for symbol, data in items:
+            manager.execute_strategies(symbol, data)
+
+    def score_all_cold():
+        manager.invalidate()
+        score_all()
+
+    stats = time_calls(cold(score_all_cold), repeat)
+    stats['per_symbol_us'] = stats['median_us'] / len(items)
+    memoized = time_calls(score_all, repeat)
+    stats['memoized_per_symbol_us'] = memoized['median_us'] / len(items)
+    stats['cache'] = manager.cache_stats()
+    return stats
+
+
+def bench_bot_cycle(bars, repeat, latency):
+    symbols = list(bars)
+    broker = SimBroker(bars, cash=1e9, holdings={symbol: 10 for symbol in symbols}, latency=latency, sleep=latency > 0)
+    bot = TradingBot(broker)
+    bot.__setPosman__(Posman(bot))
+    bot.__setBacktestManager__(BacktestManager(list(STRATEGIES), bot))
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = asyncio.run(run_simulation(bot, broker, cycles=repeat))
+    result['seconds_per_cycle'] = result['wall_seconds'] / max(result['cycles'], 1)
+    result['symbols_per_second'] = result['symbols'] / result['seconds_per_cycle'] if result['cycles'] else 0.0
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def compare(current, baseline, tolerance):
+    """
+    Yields (name, baseline, current) for every median that got slower than tolerance allows.
+    """
+    def medians(results, prefix=''):
+        for key, value in results.items():
+            if isinstance(value, dict):
+                yield from medians(value, f"{prefix}{key}.")
+            elif key in ('median_us', 'seconds_per_cycle'):
+                yield f"{prefix}{key}", value
+
+    old = dict(medians(baseline['results']))
+    for name, value in medians(current['results']):
+        if name in old and value > old[name] * (1 + tolerance):
+            yield name, old[name], value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the decision pipeline on synthetic market data.")
+    parser.add_argument('--bars', type=int, default=500, help="bars per symbol")
+    parser.add_argument('--symbols', type=int, default=50, help="number of symbols")
+    parser.add_argument('--repeat', type=int, default=20, help="timed repetitions per measurement")
+    parser.add_argument('--cycles', type=int, default=5, help="bot cycles to time")
+    parser.add_argument('--latency', type=float, default=0.0, help="simulated seconds per API call in the bot cycle")
+    parser.add_argument('--output', help="write JSON results here instead of stdout")
+    parser.add_argument('--compare', help="baseline JSON; exit 1 if any median is slower by more than --tolerance")
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.CRITICAL)  # the bot logs every decision; keep the output machine-readable
+    bars = synthetic_bars([f"SYM{i:04d}" for i in range(args.symbols)], length=args.bars)
+    report = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'config': vars(args),
+        'results': {
+            'strategies': bench_strategies(bars, args.repeat),
+            'weighted_score': bench_weighted_score(bars, args.repeat),
+            'bot_cycle': bench_bot_cycle(bars, args.cycles, args.latency),
+        },
+    }
+
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(output)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as handle:
+            regressions = list(compare(report, json.load(handle), args.tolerance))
+        for name, old, new in regressions:
+            print(f"REGRESSION {name}: {old:.1f} -> {new:.1f}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
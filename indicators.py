@@ -0,0 +1,409 @@
+from collections import OrderedDict
+import math
+import threading
+import zlib
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("Indicators")
+logger.setLevel(logging.INFO)
+
+# NumPy implementations of the indicators used by strategies.py.
+# Every function works along the last axis, so the same code scores a single
+# symbol (1-D array) or a whole panel of symbols (2-D array, symbols x bars).
+# Results line up with the pandas versions they replace (NaN until the window fills).
+
+
+def rolling_mean(values, window):
+    values = np.asarray(values, dtype=float)
+    out = np.full(values.shape, np.nan)
+    if values.shape[-1] >= window:
+        out[..., window - 1:] = sliding_window_view(values, window, axis=-1).mean(axis=-1)
+    return out
+
+
+def rolling_std(values, window, ddof=1):
+    values = np.asarray(values, dtype=float)
+    out = np.full(values.shape, np.nan)
+    if values.shape[-1] >= window:
+        out[..., window - 1:] = sliding_window_view(values, window, axis=-1).std(axis=-1, ddof=ddof)
+    return out
+
+
+def ewm_mean(values, span, block=64):
+    """
+    Exponential moving average matching pandas' ewm(span=span, adjust=False).mean().
+    The recursion y[t] = a*x[t] + (1-a)*y[t-1] is solved in closed form one block
+    at a time, which keeps it vectorized while the powers of (1-a) stay in range.
+    """
+    values = np.asarray(values, dtype=float)
+    out = np.empty(values.shape)
+    n = values.shape[-1]
+    if n == 0:
+        return out
+    alpha = 2.0 / (span + 1.0)
+    decay = 1.0 - alpha
+    if decay == 0:  # span 1: every value is its own average, and the block weights would divide by zero
+        return values.copy()
+
+    prev = values[..., 0]
+    out[..., 0] = prev
+    for start in range(1, n, block):
+        segment = values[..., start:start + block]
+        powers = decay ** np.arange(segment.shape[-1])
+        acc = alpha * np.cumsum(segment / powers, axis=-1)
+        out[..., start:start + segment.shape[-1]] = powers * (decay * prev[..., None] + acc)
+        prev = out[..., start + segment.shape[-1] - 1]
+    return out
+
+
+def diff(values):
+    values = np.asarray(values, dtype=float)
+    out = np.full(values.shape, np.nan)
+    out[..., 1:] = values[..., 1:] - values[..., :-1]
+    return out
+
+
+def pct_change(values):
+    values = np.asarray(values, dtype=float)
+    out = np.full(values.shape, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out[..., 1:] = values[..., 1:] / values[..., :-1] - 1
+    return out
+
+
+def rsi(close, period=14):
+    """
+    Simple-average RSI, same as the rolling-mean version in rsi_strategy.
+    """
+    delta = diff(close)
+    gain = rolling_mean(np.where(delta > 0, delta, 0.0), period)
+    loss = rolling_mean(np.where(delta < 0, -delta, 0.0), period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100 - (100 / (1 + gain / loss))
+
+
+def true_range(high, low, close):
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    prev_close = np.full(high.shape, np.nan)
+    prev_close[..., 1:] = np.asarray(close, dtype=float)[..., :-1]
+    # fmax ignores the missing previous close on the first bar, like DataFrame.max(axis=1)
+    return np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+
+
+def atr(high, low, close, period=14):
+    return rolling_mean(true_range(high, low, close), period)
+
+
+def crossover_signal(first, second):
+    """
+    1 where first > second, -1 where first < second, 0 otherwise.
+    """
+    return np.sign(np.asarray(first, dtype=float) - np.asarray(second, dtype=float))
+
+
+def crossover_returns(close, signal):
+    """
+    Cumulative return of following signal bar by bar (NaNs are skipped like pandas cumsum).
+    """
+    return np.nancumsum(pct_change(close) * signal, axis=-1)
+
+
+class IndicatorEngine:
+    def __init__(self, data):
+        """
+        Computes indicators for one bar set on demand and keeps them, so strategies
+        sharing an indicator read the same array instead of recomputing it.
+        data is a DataFrame of bars or any mapping of column name -> array.
+        """
+        self.data = data
+        self.cache = {}
+
+    def __len__(self):
+        return len(self.column('close'))
+
+    def __memo__(self, key, compute):
+        if key not in self.cache:
+            self.cache[key] = compute()
+        return self.cache[key]
+
+    def column(self, name):
+        return self.__memo__(('column', name), lambda: np.asarray(self.data[name], dtype=float))
+
+    def leading_columns(self):
+        """
+        The first two bar columns, which moving_average_crossover compares.
+        """
+        if hasattr(self.data, 'iloc'):
+            return self.data.iloc[:, 0].to_numpy(dtype=float), self.data.iloc[:, 1].to_numpy(dtype=float)
+        return self.column('open'), self.column('high')
+
+    def sma(self, window=20):
+        return self.__memo__(('sma', window), lambda: rolling_mean(self.column('close'), window))
+
+    def std(self, window=20):
+        return self.__memo__(('std', window), lambda: rolling_std(self.column('close'), window))
+
+    def bollinger(self, window=20, width=2):
+        """
+        Returns (lower_band, upper_band).
+        """
+        def compute():
+            sma, std_dev = self.sma(window), self.std(window)
+            return sma - width * std_dev, sma + width * std_dev
+        return self.__memo__(('bollinger', window, width), compute)
+
+    def ema(self, span):
+        return self.__memo__(('ema', span), lambda: ewm_mean(self.column('close'), span))
+
+    def macd(self, fast=12, slow=26, signal=9):
+        """
+        Returns (macd_line, signal_line).
+        """
+        def compute():
+            line = self.ema(fast) - self.ema(slow)
+            return line, ewm_mean(line, signal)
+        return self.__memo__(('macd', fast, slow, signal), compute)
+
+    def rsi(self, period=14):
+        return self.__memo__(('rsi', period), lambda: rsi(self.column('close'), period))
+
+    def atr(self, period=14):
+        return self.__memo__(('atr', period), lambda: atr(self.column('high'), self.column('low'), self.column('close'), period))
+
+    def high_range(self):
+        """
+        Returns (lowest high, highest high) over the whole bar set.
+        """
+        return self.__memo__(('high_range',), lambda: (np.nanmin(self.column('high')), np.nanmax(self.column('high'))))
+
+    def crossover_signal(self):
+        return self.__memo__(('crossover_signal',), lambda: crossover_signal(*self.leading_columns()))
+
+    def crossover_returns(self):
+        return self.__memo__(('crossover_returns',), lambda: crossover_returns(self.column('close'), self.crossover_signal()))
+
+
+class RollingWindow:
+    def __init__(self, size):
+        """
+        Fixed-size window over the last `size` values with a running sum.
+        """
+        self.size = size
+        self.values = [0.0] * size
+        self.count = 0
+        self.total = 0.0
+
+    def push(self, value):
+        slot = self.count % self.size
+        if self.count >= self.size:
+            self.total -= self.values[slot]
+        self.values[slot] = value
+        self.total += value
+        self.count += 1
+        if self.count % (self.size * 1024) == 0:
+            self.total = math.fsum(self.values)  # drop accumulated rounding drift
+
+    def full(self):
+        return self.count >= self.size
+
+    def mean(self):
+        return self.total / self.size if self.full() else float('nan')
+
+    def std(self, ddof=1):
+        if not self.full():
+            return float('nan')
+        mean = self.mean()
+        return math.sqrt(sum((v - mean) ** 2 for v in self.values) / (self.size - ddof))
+
+
+class EMA:
+    def __init__(self, span):
+        """
+        Incremental ewm(span=span, adjust=False).mean().
+        """
+        self.alpha = 2.0 / (span + 1.0)
+        self.value = float('nan')
+
+    def push(self, value):
+        if math.isnan(self.value):
+            self.value = value
+        else:
+            self.value = self.alpha * value + (1 - self.alpha) * self.value
+        return self.value
+
+
+class StreamingIndicators:
+    columns = ('open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, symbol, bollinger_window=20, rsi_period=14, atr_period=14, macd_spans=(12, 26, 9)):
+        """
+        Running indicator state for one symbol, advanced one bar at a time in O(1)
+        (O(window) for the Bollinger std) regardless of how much history came before.
+        Exposes the same accessors as IndicatorEngine, each returning an array whose
+        last element is the value as of the latest bar, so strategies can take either.
+        """
+        self.symbol = symbol
+        self.length = 0
+        self.timestamp = None
+        self.last_bar = None
+        self.prev_close = None
+        self.bollinger_window = bollinger_window
+        self.rsi_period = rsi_period
+        self.atr_period = atr_period
+        self.macd_spans = macd_spans
+
+        self.closes = RollingWindow(bollinger_window)
+        self.gains = RollingWindow(rsi_period)
+        self.losses = RollingWindow(rsi_period)
+        self.true_ranges = RollingWindow(atr_period)
+        self.ema_fast = EMA(macd_spans[0])
+        self.ema_slow = EMA(macd_spans[1])
+        self.ema_signal = EMA(macd_spans[2])
+        self.macd_value = float('nan')
+        self.high_min = float('inf')
+        self.high_max = float('-inf')
+        self.cumulative_return = 0.0
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def empty(self):
+        return self.length == 0
+
+    def update(self, bar):
+        """
+        Advance the state by one bar (a dict with open/high/low/close, as from fetch_raw_data).
+        Returns False if the bar is not newer than the last one seen.
+        """
+        timestamp = bar.get('timestamp')
+        if timestamp is not None and self.timestamp is not None and timestamp <= self.timestamp:
+            return False
+        open_, high, low, close = (float(bar[k]) for k in ('open', 'high', 'low', 'close'))
+
+        self.closes.push(close)
+        self.ema_fast.push(close)
+        self.ema_slow.push(close)
+        self.macd_value = self.ema_fast.value - self.ema_slow.value
+        self.ema_signal.push(self.macd_value)
+        self.high_min = min(self.high_min, high)
+        self.high_max = max(self.high_max, high)
+
+        if self.prev_close is None:
+            # First bar: no delta yet, which the rolling versions count as a zero gain/loss
+            self.gains.push(0.0)
+            self.losses.push(0.0)
+            self.true_ranges.push(high - low)
+        else:
+            delta = close - self.prev_close
+            self.gains.push(delta if delta > 0 else 0.0)
+            self.losses.push(-delta if delta < 0 else 0.0)
+            self.true_ranges.push(max(high - low, abs(high - self.prev_close), abs(low - self.prev_close)))
+            if self.prev_close != 0:
+                self.cumulative_return += (close / self.prev_close - 1) * np.sign(open_ - high)
+
+        self.prev_close = close
+        self.last_bar = bar
+        self.timestamp = timestamp
+        self.length += 1
+        return True
+
+    def seed(self, data):
+        """
+        Replay a DataFrame of historical bars into the state.
+        """
+        for timestamp, row in zip(data.index, data[['open', 'high', 'low', 'close']].itertuples(index=False)):
+            self.update({'open': row.open, 'high': row.high, 'low': row.low, 'close': row.close, 'timestamp': timestamp})
+        return self
+
+    def column(self, name):
+        return np.array([float(self.last_bar[name]) if self.last_bar else float('nan')])
+
+    def bollinger(self, window=20, width=2):
+        self.__check_param__(window, self.bollinger_window, 'bollinger window')
+        mean, std_dev = self.closes.mean(), self.closes.std()
+        return np.array([mean - width * std_dev]), np.array([mean + width * std_dev])
+
+    def macd(self, fast=12, slow=26, signal=9):
+        self.__check_param__((fast, slow, signal), self.macd_spans, 'MACD spans')
+        return np.array([self.macd_value]), np.array([self.ema_signal.value])
+
+    def rsi(self, period=14):
+        self.__check_param__(period, self.rsi_period, 'RSI period')
+        gain, loss = self.gains.mean(), self.losses.mean()
+        if loss == 0:
+            value = float('nan') if gain == 0 else 100.0
+        else:
+            value = 100 - (100 / (1 + gain / loss))
+        return np.array([value])
+
+    def atr(self, period=14):
+        self.__check_param__(period, self.atr_period, 'ATR period')
+        return np.array([self.true_ranges.mean()])
+
+    def high_range(self):
+        return self.high_min, self.high_max
+
+    def crossover_returns(self):
+        return np.array([self.cumulative_return])
+
+    def __check_param__(self, requested, configured, label):
+        if requested != configured:
+            raise ValueError(f"{label} {requested} does not match the streaming state for {self.symbol} ({configured})")
+
+
+__engines__ = OrderedDict()
+__engines_lock__ = threading.Lock()
+MAX_ENGINES = 1024
+
+
+def bar_set_key(symbol, data):
+    """
+    Identifies a bar set by symbol, length, first/last index label and its prices (the last
+    close and a CRC of the open/high/low/close columns), so bars re-adjusted or corrected over
+    the same dates get a new key even when only their highs or lows moved.
+    """
+    index = getattr(data, 'index', None)
+    if index is None:
+        return (symbol, id(data))
+    if len(index) == 0:
+        return (symbol, 0)
+    fingerprint = None
+    if 'close' in data:
+        crc = 0
+        for field in ('open', 'high', 'low', 'close'):
+            if field in data:
+                crc = zlib.crc32(np.ascontiguousarray(data[field], dtype=float).tobytes(), crc)
+        fingerprint = (float(np.asarray(data['close'], dtype=float)[-1]), crc)
+    return (symbol, len(index), index[0], index[-1], fingerprint)
+
+
+def indicators_for(symbol, data):
+    """
+    Returns the shared IndicatorEngine for this (symbol, bar set), creating it on first use.
+    """
+    if isinstance(data, (IndicatorEngine, StreamingIndicators)):
+        return data
+    key = bar_set_key(symbol, data)
+    with __engines_lock__:
+        engine = __engines__.get(key)
+        if engine is None:
+            engine = IndicatorEngine(data)
+            __engines__[key] = engine
+            if len(__engines__) > MAX_ENGINES:
+                __engines__.popitem(last=False)
+        else:
+            __engines__.move_to_end(key)
+    return engine
+
+
+def clear_cache():
+    """
+    Drops every shared IndicatorEngine.
+    """
+    with __engines_lock__:
+        __engines__.clear()
@@ -1,7 +1,7 @@
 import pandas as pd
 import numpy as np
-import TradingBot as bot
 import logging
+from indicators import indicators_for
 # import AlpacaAPI as alpaca
 # from AlpacaAPI import *
 logging.basicConfig(level=logging.INFO)
@@ -27,17 +27,9 @@ def moving_average_crossover(symbol, data):
             print("Data for moving average crossover is missing or incomplete.")
             return 0 
 
-        signals = []
-        for i in range(len(data)):
-            if data.iloc[i, 0] > data.iloc[i, 1]:
-                signals.append(1)  # BUY signal
-            elif data.iloc[i, 0] < data.iloc[i, 1]:
-                signals.append(-1)  # SELL signal
-            else:
-                signals.append(0)  # No signal
-        result = np.array(signals)
-        returns = (data['close'].pct_change() * result).cumsum()
-        return 1 if returns.iloc[-1] > 0 else -1
+        # Vectorized form of the old per-row iloc loop: compare the first two columns
+        returns = indicators_for(symbol, data).crossover_returns()
+        return 1 if returns[-1] > 0 else -1
 
 
 ####
@@ -46,37 +38,32 @@ def mean_reversion_strategy(symbol, data, threshold=0.02):
     """
     Mean reversion strategy based on Bollinger Bands.
     """
-    sma = data['close'].rolling(window=20).mean()
-    std_dev = data['close'].rolling(window=20).std()
-    upper_band = sma + (2 * std_dev)
-    lower_band = sma - (2 * std_dev)
+    indicators = indicators_for(symbol, data)
+    lower_band, upper_band = indicators.bollinger(window=20)
+    close = indicators.column('close')
 
-    if data['close'].iloc[-1] > upper_band.iloc[-1]:
+    if close[-1] > upper_band[-1]:
         return -1  # Sell
-    elif data['close'].iloc[-1] < lower_band.iloc[-1]:
+    elif close[-1] < lower_band[-1]:
         return 1  # Buy
     return 0  # No action
  
 
 #####
 
-def __calculate_volatility__(data):
+def __calculate_volatility__(data, symbol=None):
     if len(data) < 14:  # Ensure at least 14 rows for the rolling calculation
         logger.warning("Insufficient data for volatility calculation.")
         return float('nan')
-    high_low = data['high'] - data['low']
-    high_close = abs(data['high'] - data['close'].shift(1))
-    low_close = abs(data['low'] - data['close'].shift(1))
-    true_range = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-    atr = true_range.rolling(14).mean()
-    return atr.iloc[-1]  # Latest ATR value
-
-def volatility_calculator(self, data):
-    atr = __calculate_volatility__(data)
+    return indicators_for(symbol, data).atr(14)[-1]  # Latest ATR value
+
+def volatility_calculator(symbol, data):
+    atr = __calculate_volatility__(data, symbol)
     if pd.isna(atr):  # Handle cases where ATR cannot be calculated
         logger.warning("ATR calculation failed. Returning -1.")
         return -1
-    low, high = data['high'].min() * 0.01, data['high'].max() * 0.05  # Example dynamic bounds
+    lowest_high, highest_high = indicators_for(symbol, data).high_range()
+    low, high = lowest_high * 0.01, highest_high * 0.05  # Example dynamic bounds
     return 1 if low <= atr <= high else -1
 
 ####
@@ -85,14 +72,11 @@ def macd_strategy(symbol, data):
     """
     MACD strategy for buy/sell signals based on moving averages.
     """
-    ema12 = data['close'].ewm(span=12, adjust=False).mean()
-    ema26 = data['close'].ewm(span=26, adjust=False).mean()
-    macd = ema12 - ema26
-    signal = macd.ewm(span=9, adjust=False).mean()
+    macd, signal = indicators_for(symbol, data).macd(12, 26, 9)
 
-    if macd.iloc[-1] > signal.iloc[-1]:
+    if macd[-1] > signal[-1]:
         return 1  # Buy
-    elif macd.iloc[-1] < signal.iloc[-1]:
+    elif macd[-1] < signal[-1]:
         return -1  # Sell
     return 0  # No action
 
@@ -102,18 +86,125 @@ def rsi_strategy(symbol, data, overbought=70, oversold=30):
     """
     RSI strategy to identify overbought or oversold conditions.
     """
-    delta = data['close'].diff()
-    gain = (delta.where(delta > 0, 0)).rolling(14).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
-    rs = gain / loss
-    rsi = 100 - (100 / (1 + rs))
-
-    if rsi.iloc[-1] < oversold:
-        #print(rsi.iloc[-1])
+    rsi = indicators_for(symbol, data).rsi(14)
+
+    if rsi[-1] < oversold:
+        #print(rsi[-1])
         return 1  # Buy
-    elif rsi.iloc[-1] > overbought:
-        #print(rsi.iloc[-1])
+    elif rsi[-1] > overbought:
+        #print(rsi[-1])
         return -1  # Sell
     return 0  # No action
  
-####
\ No newline at end of file
+####
+
+#### Per-bar signal series, used by the vectorized backtester.
+# Each takes an IndicatorEngine and returns the strategy's signal at every bar
+# (what the scalar strategy above would return if the data ended at that bar).
+# They work along the last axis, so a 2-D panel scores many symbols at once.
+
+def moving_average_crossover_signals(indicators):
+    return np.where(indicators.crossover_returns() > 0, 1, -1)
+
+
+def mean_reversion_signals(indicators, window=20, width=2):
+    lower_band, upper_band = indicators.bollinger(window=window, width=width)
+    close = indicators.column('close')
+    return np.where(close > upper_band, -1, np.where(close < lower_band, 1, 0))
+
+
+def volatility_signals(indicators, period=14):
+    atr = indicators.atr(period)
+    high_prices = indicators.column('high')
+    low = np.fmin.accumulate(high_prices, axis=-1) * 0.01
+    high = np.fmax.accumulate(high_prices, axis=-1) * 0.05
+    # NaN ATR (not enough bars yet) compares False and falls through to -1, as in volatility_calculator
+    return np.where((low <= atr) & (atr <= high), 1, -1)
+
+
+def macd_signals(indicators, fast=12, slow=26, signal=9):
+    macd, signal_line = indicators.macd(fast, slow, signal)
+    return np.sign(macd - signal_line)
+
+
+def rsi_signals(indicators, overbought=70, oversold=30, period=14):
+    rsi = indicators.rsi(period)
+    return np.where(rsi < oversold, 1, np.where(rsi > overbought, -1, 0))
+
+
+SIGNAL_SERIES = {
+    moving_average_crossover: moving_average_crossover_signals,
+    mean_reversion_strategy: mean_reversion_signals,
+    volatility_calculator: volatility_signals,
+    macd_strategy: macd_signals,
+    rsi_strategy: rsi_signals,
+}
+
+
+def signal_series(strategy):
+    """
+    The per-bar signal function of a registered Strategy or a plain strategy function, or None.
+    """
+    return getattr(strategy, 'signals', None) or SIGNAL_SERIES.get(strategy)
+
+
+#### Strategy registry
+
+class Strategy:
+    def __init__(self, name, score, signals, lookback=None, fields=('close',), indicators=()):
+        """
+        A strategy together with what it reads, so callers can load and compute only that.
+            score(symbol, data): the scalar vote on the last bar (the classic strategy function)
+            signals(indicators): its vote at every bar, working on 1-D or symbols x bars panels
+            lookback: trailing bars the last vote depends on, or None for the whole history
+            fields: bar columns it reads
+            indicators: (IndicatorEngine method, *args) it shares with other strategies
+        Instances are called like the function they wrap, so (strategy, weight) lists and the
+        rest of the bot take them unchanged.
+        """
+        self.name = self.__name__ = self.__qualname__ = name
+        self.score = score
+        self.signals = signals
+        self.lookback = lookback
+        self.fields = tuple(fields)
+        self.indicators = tuple(indicators)
+
+    def __call__(self, symbol, data):
+        return self.score(symbol, data)
+
+    def __repr__(self):
+        return f"Strategy({self.name})"
+
+
+REGISTRY = {}  # name -> Strategy
+
+
+def register(strategy):
+    """
+    Add a Strategy to the registry (replacing one of the same name) and return it.
+    """
+    REGISTRY[strategy.name] = strategy
+    return strategy
+
+
+register(Strategy('moving_average_crossover', moving_average_crossover, moving_average_crossover_signals,
+                  fields=('open', 'high', 'close'), indicators=(('crossover_returns',),)))
+register(Strategy('volatility_calculator', volatility_calculator, volatility_signals,
+                  fields=('high', 'low', 'close'), indicators=(('atr', 14),)))
+register(Strategy('macd_strategy', macd_strategy, macd_signals, indicators=(('macd', 12, 26, 9),)))
+register(Strategy('mean_reversion_strategy', mean_reversion_strategy, mean_reversion_signals,
+                  lookback=20, indicators=(('bollinger', 20, 2),)))
+register(Strategy('rsi_strategy', rsi_strategy, rsi_signals, lookback=15, indicators=(('rsi', 14),)))
+
+
+def default_strategies():
+    """
+    The bot's standard weighted strategy stack, without the account-dependent position sizing vote.
+    """
+    return [
+        (REGISTRY['moving_average_crossover'], 1.5),
+        (REGISTRY['volatility_calculator'], 1.0),
+        (REGISTRY['macd_strategy'], 1.2),
+        (REGISTRY['mean_reversion_strategy'], 1.2),
+        (REGISTRY['rsi_strategy'], 1.1),
+    ]